@@ -0,0 +1,139 @@
+import threading
+import logging
+from typing import Optional
+
+import numpy as np
+import sounddevice as sd
+
+from audio.vad import NoiseFloor
+from runtime import metrics
+
+log = logging.getLogger("audio_capture")
+
+OVERRUNS = metrics.Counter("bring_audio_ring_overruns_total",
+                           "Samples a slow ring reader lost to the writer")
+INPUT_STATUS = metrics.Counter("bring_audio_input_status_total",
+                               "Input stream callbacks flagged with an over/underflow")
+
+
+class AudioRing:
+    """
+    Single-writer, multi-reader ring buffer of int16 samples.
+
+    The writer (the audio callback) copies samples in and then advances
+    `written`, an absolute sample count; it never waits on a reader. Each
+    reader keeps its own absolute position, so any number of consumers can
+    read the same audio, and can start from a point in the past (pre-roll) as
+    long as it is still within `capacity` samples. The condition variable is
+    only used to wake readers up, and the writer never blocks on it: if a
+    reader holds it at that moment the wake-up is skipped, and that reader
+    sees the samples at the next block (or its timeout).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = np.zeros(capacity, dtype=np.int16)
+        self.written = 0
+        self._cond = threading.Condition()
+
+    def write(self, samples: np.ndarray):
+        n = len(samples)
+        if n > self.capacity:
+            samples, n = samples[-self.capacity:], self.capacity
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = samples[:first]
+        self._buf[:n - first] = samples[first:]
+        # A single store publishes the new samples to readers
+        self.written += n
+        if self._cond.acquire(blocking=False):
+            try:
+                self._cond.notify_all()
+            finally:
+                self._cond.release()
+
+    def wait(self, position: int, timeout: Optional[float]) -> bool:
+        """Wait until samples up to `position` have been written."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.written >= position, timeout)
+
+    def copy(self, position: int, out: np.ndarray):
+        start = position % self.capacity
+        n = len(out)
+        first = min(n, self.capacity - start)
+        out[:first] = self._buf[start:start + first]
+        out[first:] = self._buf[:n - first]
+
+    def reader(self, start: Optional[int] = None) -> "RingReader":
+        """A reader at absolute sample `start` (default: now), clamped to what is still buffered."""
+        written = self.written
+        if start is None:
+            start = written
+        return RingReader(self, max(start, written - self.capacity, 0))
+
+
+class RingReader:
+    def __init__(self, ring: AudioRing, position: int):
+        self.ring = ring
+        self.position = position
+
+    def available(self) -> int:
+        return self.ring.written - self.position
+
+    def read(self, out: np.ndarray, timeout: Optional[float] = None) -> bool:
+        """
+        Fill `out` with the next len(out) samples. Returns False on timeout.
+        A reader that fell more than a ring behind skips ahead to stay current.
+        """
+        ring, n = self.ring, len(out)
+        if not ring.wait(self.position + n, timeout):
+            return False
+        lag = ring.written - self.position
+        if lag > ring.capacity:
+            OVERRUNS.inc(lag - ring.capacity)
+            self.position = ring.written - n
+        ring.copy(self.position, out)
+        # The writer may have lapped us during the copy
+        if ring.written - self.position > ring.capacity:
+            OVERRUNS.inc()
+            self.position = ring.written - n
+            ring.copy(self.position, out)
+        self.position += n
+        return True
+
+
+class AudioCapture:
+    """
+    One input stream kept open for the lifetime of the assistant, feeding an
+    AudioRing and keeping the background noise estimate up to date.
+    """
+
+    def __init__(self, sample_rate: int, ring_seconds: float, blocksize: int = 1024):
+        self.sample_rate = sample_rate
+        self.ring = AudioRing(int(sample_rate * ring_seconds))
+        self.noise = NoiseFloor(sample_rate, blocksize)
+        self.stream = sd.InputStream(
+            samplerate=sample_rate,
+            channels=1,
+            dtype="int16",
+            blocksize=blocksize,
+            callback=self._callback,
+        )
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            INPUT_STATUS.inc()
+        samples = indata[:, 0]
+        self.ring.write(samples)
+        self.noise.update(samples)
+
+    def start(self):
+        self.stream.start()
+        log.info("Audio capture started at %d Hz", self.sample_rate)
+
+    def stop(self):
+        self.stream.stop()
+        self.stream.close()
+
+    def reader(self, start: Optional[int] = None) -> RingReader:
+        return self.ring.reader(start)
@@ -0,0 +1,104 @@
+import numpy as np
+
+
+def lowpass_taps(num_taps: int, cutoff: float, rate: float, beta: float = 5.65) -> np.ndarray:
+    """Kaiser-windowed sinc low-pass FIR (beta 5.65 gives about 60 dB of stopband)."""
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    fc = cutoff / rate
+    taps = 2 * fc * np.sinc(2 * fc * n) * np.kaiser(num_taps, beta)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+def resample(samples: np.ndarray, in_rate: int, out_rate: int) -> np.ndarray:
+    """
+    Arbitrary-ratio resampling of float audio (samples along axis 0), for
+    sounds converted once at load time: low-pass below the lower Nyquist,
+    then linear interpolation.
+    """
+    if in_rate == out_rate:
+        return samples.astype(np.float32)
+    taps = lowpass_taps(63, cutoff=0.45 * min(in_rate, out_rate), rate=in_rate)
+    positions = np.arange(int(len(samples) * out_rate / in_rate)) * (in_rate / out_rate)
+    columns = samples.reshape(len(samples), -1).T
+    out = np.stack([
+        np.interp(positions, np.arange(len(column)), np.convolve(column, taps, mode="same"))
+        for column in columns
+    ], axis=1)
+    return out.reshape((len(positions),) + samples.shape[1:]).astype(np.float32)
+
+
+class Decimator:
+    """
+    Anti-aliased integer-factor downsampling of int16 audio, in fixed-size chunks.
+
+    Polyphase FIR: the input is viewed as rows of `factor` samples, and every
+    output sample is the dot product of the last taps/factor rows with the
+    matching filter phases. Only outputs that are kept are computed, filter
+    history carries over between chunks, and all buffers are allocated once.
+    The returned array is reused by the next call.
+    """
+
+    def __init__(self, factor: int, chunk_size: int, in_rate: int, taps_per_phase: int = 40):
+        if chunk_size % factor:
+            raise ValueError(f"chunk_size {chunk_size} is not a multiple of factor {factor}")
+        self.factor = factor
+        self.chunk_size = chunk_size
+        out_rate = in_rate / factor
+        # Pass up to ~0.8x the output Nyquist, stop by Nyquist so nothing folds back
+        taps = lowpass_taps(taps_per_phase * factor, cutoff=0.45 * out_rate, rate=in_rate)
+        # phases[k] weighs row (n - k) of the input: h[kD:(k+1)D] reversed
+        self._phases = [taps[k * factor:(k + 1) * factor][::-1].copy()
+                        for k in range(taps_per_phase)]
+
+        self._history = taps_per_phase - 1
+        self._out_len = chunk_size // factor
+        self._work = np.zeros((self._history + self._out_len) * factor, dtype=np.float32)
+        self._rows = self._work.reshape(-1, factor)
+        self._acc = np.empty(self._out_len, dtype=np.float32)
+        self._tmp = np.empty(self._out_len, dtype=np.float32)
+        self._out = np.empty(self._out_len, dtype=np.int16)
+
+    def reset(self):
+        self._work[:] = 0
+
+    def process(self, pcm: np.ndarray) -> np.ndarray:
+        rows, history, out_len = self._rows, self._history, self._out_len
+        self._work[history * self.factor:] = pcm
+
+        acc, tmp = self._acc, self._tmp
+        np.dot(rows[history:history + out_len], self._phases[0], out=acc)
+        for k in range(1, len(self._phases)):
+            start = history - k
+            np.dot(rows[start:start + out_len], self._phases[k], out=tmp)
+            acc += tmp
+        rows[:history] = rows[out_len:out_len + history]
+
+        np.rint(acc, out=acc)
+        np.clip(acc, -32768, 32767, out=acc)
+        self._out[:] = acc
+        return self._out
+
+
+class StreamResampler:
+    """
+    Linear-interpolation resampling of a float32 stream that arrives in blocks
+    of any size (e.g. 24 kHz TTS into the 48 kHz mixer); continuity across
+    blocks is kept by carrying the last input sample and the output phase.
+    Meant for upsampling: there's no anti-aliasing filter.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int):
+        self.step = in_rate / out_rate
+        self._last = 0.0
+        # Position of the next output sample, in input samples, counted from
+        # the last sample of the previous block
+        self._position = 1.0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        x = np.concatenate(([self._last], block))
+        end = len(block)
+        count = int((end - self._position) // self.step) + 1 if self._position <= end else 0
+        positions = self._position + self.step * np.arange(count)
+        self._position += self.step * count - end
+        self._last = x[-1]
+        return np.interp(positions, np.arange(len(x)), x).astype(np.float32)
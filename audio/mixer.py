@@ -0,0 +1,213 @@
+import os
+import threading
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+
+from audio.dsp import resample
+
+log = logging.getLogger("voice_assistant")
+
+
+class SoundCache:
+    """Sound files decoded once, resampled to the output rate and kept in memory as mono float32."""
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self._sounds: Dict[str, np.ndarray] = {}
+
+    def load(self, path: str) -> Optional[np.ndarray]:
+        if path in self._sounds:
+            return self._sounds[path]
+        if not os.path.exists(path):
+            return None
+        try:
+            data, rate = sf.read(path, dtype="float32", always_2d=True)
+        except Exception as e:
+            log.warning("Could not load sound %s: %s", path, e)
+            return None
+        mono = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+        self._sounds[path] = resample(mono, rate, self.rate)
+        return self._sounds[path]
+
+    def load_dir(self, directory: str, extensions=(".wav", ".flac")) -> List[str]:
+        """Load every sound in `directory`; returns the paths that loaded."""
+        if not os.path.isdir(directory):
+            return []
+        paths = [os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.endswith(extensions)]
+        return [p for p in paths if self.load(p) is not None]
+
+    def get(self, path: str) -> Optional[np.ndarray]:
+        return self._sounds.get(path)
+
+
+CHANNELS = ("ui", "music", "speech")
+
+
+class Voice:
+    """One sound playing in the Mixer; `done` is set once it has finished or faded out."""
+
+    def __init__(self, samples: np.ndarray, gain: float = 1.0, step: float = 1.0):
+        self.samples = samples
+        self.position = 0
+        self.gain = gain
+        self.target = 1.0
+        self.step = step  # gain change per sample while fading
+        self.done = threading.Event()
+
+
+class Channel:
+    """
+    A named mixer input: one-shot voices and/or a streaming source (anything
+    with fill(out) and a `done` Event, like a JitterBuffer), behind a gain.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.voices: List[Voice] = []
+        self.source = None
+        self.gain = 1.0
+        self.target = 1.0
+
+    @property
+    def active(self) -> bool:
+        return bool(self.voices) or self.source is not None
+
+
+class Mixer:
+    """
+    One output stream that stays open for the assistant's lifetime. Channels
+    ("ui", "music", "speech") are summed in the audio callback, music is
+    ducked while anything plays on the others, and every gain change (ducking,
+    fades, crossfades, stops) is ramped so nothing clicks.
+    """
+
+    def __init__(self, rate: int, blocksize: int = 1024, duck_gain: float = 0.3,
+                 fade_seconds: float = 0.05):
+        self.rate = rate
+        self.duck_gain = duck_gain
+        self.fade_seconds = fade_seconds
+        self.channels: Dict[str, Channel] = {name: Channel(name) for name in CHANNELS}
+        self._step = self._fade_step(fade_seconds)
+        self._lock = threading.Lock()
+        self._alloc(blocksize)
+        self.stream = sd.OutputStream(
+            samplerate=rate, channels=1, dtype="float32", blocksize=blocksize, callback=self._callback,
+        )
+
+    def _alloc(self, frames: int):
+        self._index = np.arange(1, frames + 1, dtype=np.float32)
+        self._mix = np.empty(frames, dtype=np.float32)
+        self._tmp = np.empty(frames, dtype=np.float32)
+        self._ramp_buf = np.empty(frames, dtype=np.float32)
+
+    def _fade_step(self, seconds: float) -> float:
+        return 1.0 / max(1, int(seconds * self.rate))
+
+    def _ramp(self, gain: float, target: float, step: float, n: int):
+        """Per-sample gains from `gain` toward `target`; returns (gains, gain reached)."""
+        ramp = self._ramp_buf[:n]
+        if gain == target:
+            ramp.fill(gain)
+            return ramp, gain
+        delta = step if target > gain else -step
+        np.multiply(self._index[:n], delta, out=ramp)
+        ramp += gain
+        if delta > 0:
+            np.minimum(ramp, target, out=ramp)
+        else:
+            np.maximum(ramp, target, out=ramp)
+        return ramp, float(ramp[-1]) if n else gain
+
+    def _render(self, channel: Channel, mix: np.ndarray):
+        frames = len(mix)
+        mix.fill(0)
+        for voice in channel.voices:
+            n = min(frames, len(voice.samples) - voice.position)
+            segment = voice.samples[voice.position:voice.position + n]
+            if voice.gain == voice.target == 1.0:
+                mix[:n] += segment
+            else:
+                ramp, voice.gain = self._ramp(voice.gain, voice.target, voice.step, n)
+                np.multiply(segment, ramp, out=self._tmp[:n])
+                mix[:n] += self._tmp[:n]
+            voice.position += n
+            if voice.position >= len(voice.samples) or voice.gain == voice.target == 0.0:
+                voice.done.set()
+        if any(v.done.is_set() for v in channel.voices):
+            channel.voices = [v for v in channel.voices if not v.done.is_set()]
+
+        if channel.source is not None:
+            tmp = self._tmp[:frames]
+            channel.source.fill(tmp)
+            mix += tmp
+            if channel.source.done.is_set():
+                channel.source = None
+
+    def _callback(self, outdata, frames, time_info, status):
+        if frames > len(self._mix):
+            self._alloc(frames)
+        out = outdata[:, 0]
+        out.fill(0)
+        mix = self._mix[:frames]
+        with self._lock:
+            ducked = self.channels["ui"].active or self.channels["speech"].active
+            self.channels["music"].target = self.duck_gain if ducked else 1.0
+            for channel in self.channels.values():
+                if not channel.active:
+                    # Idle channels still move toward their target, without rendering
+                    channel.gain = channel.target
+                    continue
+                self._render(channel, mix)
+                ramp, channel.gain = self._ramp(channel.gain, channel.target, self._step, frames)
+                if channel.gain != 1.0 or ramp[0] != 1.0:
+                    mix *= ramp
+                out += mix
+        np.clip(out, -1.0, 1.0, out=out)
+
+    def play(self, samples: np.ndarray, channel: str = "ui", fade: float = 0.0) -> Voice:
+        """Start playing mono float32 samples at the mixer rate; returns immediately."""
+        voice = Voice(samples, gain=0.0 if fade else 1.0, step=self._fade_step(fade))
+        with self._lock:
+            self.channels[channel].voices.append(voice)
+        return voice
+
+    def crossfade(self, samples: np.ndarray, channel: str = "music", fade: float = 1.0) -> Voice:
+        """Fade whatever plays on `channel` out while `samples` fades in."""
+        self.fade_out(channel, fade)
+        return self.play(samples, channel, fade)
+
+    def fade_out(self, channel: str, fade: Optional[float] = None):
+        step = self._fade_step(self.fade_seconds if fade is None else fade)
+        with self._lock:
+            for voice in self.channels[channel].voices:
+                voice.target, voice.step = 0.0, step
+
+    def attach(self, channel: str, source):
+        """Play a streaming source on `channel` until its `done` Event is set."""
+        with self._lock:
+            self.channels[channel].source = source
+
+    def detach(self, channel: str, source):
+        with self._lock:
+            if self.channels[channel].source is source:
+                self.channels[channel].source = None
+
+    def start(self):
+        self.stream.start()
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+        with self._lock:
+            for channel in self.channels.values():
+                for voice in channel.voices:
+                    voice.done.set()
+                channel.voices = []
+                if channel.source is not None:
+                    # Whoever waits for it to drain (StreamPlayer.play) returns
+                    channel.source.done.set()
+                    channel.source = None
@@ -0,0 +1,193 @@
+import io
+import time
+import base64
+import struct
+import threading
+import logging
+from collections import deque
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import requests
+import soundfile as sf
+
+from audio.dsp import StreamResampler
+from audio.mixer import Mixer
+from runtime import metrics
+
+log = logging.getLogger("voice_assistant")
+
+UNDERRUNS = metrics.Counter("bring_playback_underruns_total",
+                            "Times streamed playback ran out of audio and re-buffered")
+
+RESPONSE_CHUNK_BYTES = 4096
+WAV_MIMES = ("audio/wav", "audio/x-wav", "audio/wave")
+PCM_MIMES = ("audio/pcm", "audio/l16")
+
+
+class JitterBuffer:
+    """
+    Smooths network delivery for a callback-driven output stream. Playback
+    starts once `prebuffer` samples are queued (or the input has ended); on
+    an underrun it outputs silence and buffers again.
+    """
+
+    def __init__(self, prebuffer: int):
+        self.prebuffer = prebuffer
+        self.first_audio_at: Optional[float] = None
+        self.done = threading.Event()
+        self._blocks = deque()
+        self._offset = 0  # samples already played from _blocks[0]
+        self._queued = 0
+        self._closed = False
+        self._buffering = True
+        self._lock = threading.Lock()
+
+    def push(self, samples: np.ndarray):
+        with self._lock:
+            self._blocks.append(samples)
+            self._queued += len(samples)
+
+    def close(self):
+        """No more audio is coming: play out whatever is left."""
+        with self._lock:
+            self._closed = True
+
+    def fill(self, out: np.ndarray):
+        """Audio callback side: fill `out` completely, with silence if needed."""
+        with self._lock:
+            if self._buffering and not self._closed and self._queued < self.prebuffer:
+                out.fill(0)
+                return
+            self._buffering = False
+            if self.first_audio_at is None and self._queued:
+                self.first_audio_at = time.perf_counter()
+
+            written = 0
+            while written < len(out) and self._blocks:
+                block = self._blocks[0]
+                n = min(len(out) - written, len(block) - self._offset)
+                out[written:written + n] = block[self._offset:self._offset + n]
+                written += n
+                self._offset += n
+                self._queued -= n
+                if self._offset == len(block):
+                    self._blocks.popleft()
+                    self._offset = 0
+
+            if written < len(out):
+                out[written:].fill(0)
+                if self._closed:
+                    self.done.set()
+                else:
+                    UNDERRUNS.inc()
+                    self._buffering = True
+
+
+def _parse_content_type(value: str) -> Tuple[str, dict]:
+    parts = [p.strip() for p in value.split(";")]
+    params = {}
+    for p in parts[1:]:
+        if "=" in p:
+            k, v = p.split("=", 1)
+            params[k.strip().lower()] = v.strip()
+    return parts[0].lower(), params
+
+
+def _pcm_blocks(chunks: Iterator[bytes], channels: int, byteorder: str) -> Iterator[np.ndarray]:
+    """int16 PCM byte chunks -> mono float32 blocks; carries partial frames over."""
+    dtype = np.dtype(byteorder + "i2")
+    frame_bytes = 2 * channels
+    remainder = b""
+    for chunk in chunks:
+        data = remainder + chunk
+        usable = len(data) - len(data) % frame_bytes
+        remainder = data[usable:]
+        if not usable:
+            continue
+        samples = np.frombuffer(data, dtype=dtype, count=usable // 2).astype(np.float32) / 32768
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1)
+        yield samples
+
+
+def _wav_stream(chunks: Iterator[bytes]) -> Tuple[int, Iterator[np.ndarray]]:
+    """Parse a 16-bit PCM WAV header off the front of a byte stream."""
+    buf = b""
+    pos = 12
+    fmt = None
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= pos + 8:
+            chunk_id, size = struct.unpack_from("<4sI", buf, pos)
+            if chunk_id == b"fmt ":
+                if len(buf) < pos + 8 + 16:
+                    break
+                audio_format, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", buf, pos + 8)
+                if audio_format not in (1, 0xFFFE) or bits != 16:
+                    raise ValueError(f"Unsupported WAV stream: format={audio_format} bits={bits}")
+                fmt = channels, rate
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("WAV stream has no fmt chunk before data")
+                channels, rate = fmt
+                rest = buf[pos + 8:]
+
+                def body():
+                    yield rest
+                    yield from chunks
+                return rate, _pcm_blocks(body(), channels, "<")
+            pos += 8 + size + (size & 1)
+    raise ValueError("WAV stream ended before its data chunk")
+
+
+def response_audio(response: requests.Response) -> Tuple[int, Iterator[np.ndarray]]:
+    """
+    Decode an AI backend response into (sample rate, mono float32 blocks),
+    yielding audio as it arrives for streamed formats:
+      audio/wav            16-bit PCM WAV, streamed
+      audio/pcm, audio/L16 raw 16-bit PCM (rate=, channels= parameters; L16 is big-endian)
+      application/json     legacy {"content": base64 audio file}, decoded once complete
+    """
+    mime, params = _parse_content_type(response.headers.get("Content-Type", ""))
+    chunks = response.iter_content(RESPONSE_CHUNK_BYTES)
+    if mime in WAV_MIMES:
+        return _wav_stream(chunks)
+    if mime in PCM_MIMES:
+        rate = int(params.get("rate", 24000))
+        channels = int(params.get("channels", 1))
+        return rate, _pcm_blocks(chunks, channels, ">" if mime == "audio/l16" else "<")
+
+    audio_b64 = response.json().get("content")
+    if not audio_b64:
+        return 0, iter(())
+    data, rate = sf.read(io.BytesIO(base64.b64decode(audio_b64)), dtype="float32", always_2d=True)
+    return rate, iter((data.mean(axis=1) if data.shape[1] > 1 else data[:, 0],))
+
+
+class StreamPlayer:
+    """Plays a stream of blocks on the mixer's speech channel through a JitterBuffer."""
+
+    def __init__(self, mixer: Mixer, prebuffer_seconds: float = 0.2):
+        self.mixer = mixer
+        self.prebuffer_seconds = prebuffer_seconds
+
+    def play(self, rate: int, blocks: Iterable[np.ndarray],
+             stop: Optional[threading.Event] = None) -> Optional[float]:
+        """Blocks until playback ends; returns when the first sample was played (perf_counter)."""
+        buffer = JitterBuffer(int(self.prebuffer_seconds * self.mixer.rate))
+        resampler = StreamResampler(rate, self.mixer.rate) if rate != self.mixer.rate else None
+
+        self.mixer.attach("speech", buffer)
+        try:
+            for block in blocks:
+                if stop is not None and stop.is_set():
+                    break
+                buffer.push(resampler.process(block) if resampler else block)
+            buffer.close()
+            while not buffer.done.wait(0.1):
+                if stop is not None and stop.is_set():
+                    break
+        finally:
+            self.mixer.detach("speech", buffer)
+        return buffer.first_audio_at
@@ -0,0 +1,181 @@
+import io
+import queue
+import struct
+import threading
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+import requests
+import soundfile as sf
+
+log = logging.getLogger("voice_assistant")
+
+# codec -> (soundfile format, subtype, MIME type)
+CODECS = {
+    "wav": ("WAV", "PCM_16", "audio/wav"),
+    "flac": ("FLAC", "PCM_16", "audio/flac"),
+    "opus": ("OGG", "OPUS", "audio/ogg"),
+}
+# FLAC streamed without its final header reports a bogus length to libsndfile
+STREAM_CODECS = ("wav", "opus")
+
+
+def encode_audio(audio: np.ndarray, sample_rate: int, codec: str) -> Tuple[bytes, str]:
+    """Encode a whole recording in memory; returns (bytes, MIME type)."""
+    fmt, subtype, mime = CODECS[codec]
+    buf = io.BytesIO()
+    sf.write(buf, audio, sample_rate, format=fmt, subtype=subtype)
+    return buf.getvalue(), mime
+
+
+class _DrainSink(io.RawIOBase):
+    """
+    Seekable file object for soundfile whose appended bytes can be taken away as
+    soon as they are written. Only bytes not drained yet are kept. Rewrites of
+    already-drained bytes (FLAC/WAV fix up their header on close) are dropped,
+    so a streamed header keeps whatever sizes it had when it was drained.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._data = bytearray()
+        self._base = 0  # absolute offset of _data[0]
+        self._pos = 0
+        self._size = 0
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = offset
+        return self._pos
+
+    def read(self, size=-1):
+        return b""
+
+    def readinto(self, b):
+        return 0
+
+    def write(self, b):
+        n = len(b)
+        start = self._pos - self._base
+        if start < 0:
+            b = memoryview(b)[-start:]
+            start = 0
+        if len(b):
+            if start > len(self._data):
+                self._data.extend(bytes(start - len(self._data)))
+            self._data[start:start + len(b)] = b
+        self._pos += n
+        self._size = max(self._size, self._pos)
+        return n
+
+    def drain(self) -> bytes:
+        data = bytes(self._data)
+        self._base += len(self._data)
+        self._data.clear()
+        return data
+
+
+def _unknown_length_wav(header: bytearray) -> bool:
+    """
+    Set the RIFF and data chunk sizes of a WAV header still being written
+    (8 and 0 at that point) to 0xFFFFFFFF, the usual marker for "read to the
+    end" in streamed WAV. False if the data chunk isn't in `header` yet.
+    """
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id, size = header[offset:offset + 4], struct.unpack_from("<I", header, offset + 4)[0]
+        if chunk_id == b"data":
+            struct.pack_into("<I", header, 4, 0xFFFFFFFF)
+            struct.pack_into("<I", header, offset + 4, 0xFFFFFFFF)
+            return True
+        offset += 8 + size + (size & 1)
+    return False
+
+
+class AudioUpload:
+    """
+    Streams a recording to the AI backend while it is being recorded: blocks
+    are encoded as they arrive and sent as one chunked-transfer POST, so the
+    backend already has most of the audio when the user stops talking.
+    """
+
+    def __init__(self, url: str, sample_rate: int, codec: str, timeout: float):
+        if codec not in STREAM_CODECS:
+            raise ValueError(f"Codec '{codec}' can't be streamed, use one of {STREAM_CODECS}")
+        fmt, subtype, self.mime = CODECS[codec]
+        self.url = url
+        self.timeout = timeout
+        self.bytes_sent = 0
+        self._sink = _DrainSink()
+        # The real sizes are only known on close, after the header has gone out
+        self._patch_header = codec == "wav"
+        self._file = sf.SoundFile(self._sink, "w", sample_rate, 1, format=fmt, subtype=subtype)
+        self._chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._response: Optional[requests.Response] = None
+        self._error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._post, daemon=True)
+        self._thread.start()
+
+    def _body(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                return
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    def _post(self):
+        try:
+            self._response = requests.post(
+                self.url,
+                data=self._body(),
+                headers={"Content-Type": self.mime},
+                timeout=self.timeout,
+                stream=True,
+            )
+        except Exception as e:
+            self._error = e
+
+    def _flush(self):
+        if self._patch_header:
+            if not _unknown_length_wav(self._sink._data):
+                return
+            self._patch_header = False
+        data = self._sink.drain()
+        if data:
+            self._chunks.put(data)
+
+    def write(self, samples: np.ndarray):
+        self._file.write(samples)
+        self._flush()
+
+    def finish(self) -> requests.Response:
+        """Send the rest and wait for the backend's answer (body not read yet)."""
+        self._file.close()
+        self._flush()
+        self._chunks.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+        return self._response
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        self._chunks.put(None)
@@ -0,0 +1,173 @@
+import logging
+from typing import Optional
+
+import numpy as np
+
+from audio.dsp import Decimator
+
+log = logging.getLogger("voice_assistant")
+
+FULL_SCALE = 32768.0 ** 2  # int16 energy -> [0, 1]
+
+
+class NoiseFloor:
+    """
+    Background noise energy by minimum statistics: the lowest block energy seen
+    over the last `window` seconds. Even continuous speech has low-energy gaps
+    between syllables, so the floor keeps tracking the room rather than the
+    talker. Updated from the capture callback; allocation-free.
+    """
+
+    # The minimum of a noisy energy estimate sits below its mean
+    BIAS = 1.5
+
+    def __init__(self, sample_rate: int, blocksize: int, window: float = 3.0):
+        self._energies = np.full(max(1, int(window * sample_rate / blocksize)), np.inf)
+        self._index = 0
+        self._scratch = np.empty(blocksize, dtype=np.float32)
+        self.energy = 0.0
+
+    def update(self, samples: np.ndarray):
+        n = len(samples)
+        if n > len(self._scratch):
+            self._scratch = np.empty(n, dtype=np.float32)
+        squares = self._scratch[:n]
+        np.multiply(samples, samples, out=squares, dtype=np.float32)
+        self._energies[self._index] = squares.sum() / (n * FULL_SCALE) if n else 0.0
+        self._index = (self._index + 1) % len(self._energies)
+        self.energy = float(self._energies.min()) * self.BIAS
+
+
+class ThresholdVAD:
+    """The original fixed RMS threshold."""
+
+    def __init__(self, threshold: float = 0.035):
+        self.threshold = threshold
+
+    def reset(self):
+        pass
+
+    def is_speech(self, block: np.ndarray) -> bool:
+        return float(np.sqrt(np.dot(block, block) / len(block))) > self.threshold
+
+
+class EnergyVAD:
+    """Speech when block energy is `snr_db` above the adaptive noise floor."""
+
+    def __init__(self, noise: NoiseFloor, snr_db: float = 10.0, min_rms: float = 0.005):
+        self.noise = noise
+        self.ratio = 10 ** (snr_db / 10)
+        self.min_energy = min_rms ** 2
+
+    def reset(self):
+        pass
+
+    def is_speech(self, block: np.ndarray) -> bool:
+        energy = float(np.dot(block, block)) / len(block)
+        return energy > max(self.noise.energy * self.ratio, self.min_energy)
+
+
+class OnnxVAD:
+    """
+    Silero VAD (v5 ONNX export) run through onnxruntime, which openWakeWord
+    already depends on. Blocks are decimated to 16 kHz; the model's recurrent
+    state and the last CONTEXT samples, which the v5 export expects in front
+    of every frame, are kept across blocks.
+    """
+
+    FRAME = 512  # samples at 16 kHz per inference
+    CONTEXT = 64
+
+    def __init__(self, model_path: str, sample_rate: int, block_samples: int,
+                 threshold: float = 0.5):
+        import onnxruntime as ort
+
+        factor = sample_rate // 16000
+        if block_samples != self.FRAME * factor:
+            raise ValueError(f"OnnxVAD needs {self.FRAME * factor}-sample blocks at {sample_rate} Hz")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.threshold = threshold
+        self.decimator = Decimator(factor, block_samples, sample_rate)
+        self._input = np.zeros((1, self.CONTEXT + self.FRAME), dtype=np.float32)
+        self._state = np.zeros((2, 1, 128), dtype=np.float32)
+        self._sr = np.array(16000, dtype=np.int64)
+
+    def reset(self):
+        self._state[:] = 0
+        self._input[:] = 0
+        self.decimator.reset()
+
+    def is_speech(self, block: np.ndarray) -> bool:
+        # Decimator works on int16 samples
+        pcm = self.decimator.process(np.clip(block * 32768, -32768, 32767).astype(np.int16))
+        frame = self._input[0]
+        frame[:self.CONTEXT] = frame[-self.CONTEXT:]
+        frame[self.CONTEXT:] = pcm
+        frame[self.CONTEXT:] /= 32768
+        prob, self._state = self.session.run(
+            None, {"input": self._input, "state": self._state, "sr": self._sr},
+        )
+        return float(prob[0][0]) >= self.threshold
+
+
+class Endpointer:
+    """
+    Ends a turn once `hangover` seconds of non-speech follow at least
+    `min_speech` seconds of speech.
+
+    Nothing in the first `arm_after` seconds counts (the end of the wake word
+    in the pre-roll, the start prompt), nor any speech that was already going
+    on then: the turn starts at the first onset after a non-speech block
+    past that point.
+    """
+
+    def __init__(self, vad, sample_rate: int, hangover: float = 0.4, min_speech: float = 0.1,
+                 arm_after: float = 0.0):
+        self.vad = vad
+        self.sample_rate = sample_rate
+        self.hangover = hangover
+        self.min_speech = min_speech
+        self.arm_after = arm_after
+        self.elapsed = 0.0
+        self.armed = arm_after <= 0
+        self.speech_time = 0.0
+        self.silence_time = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self.speech_time >= self.min_speech
+
+    def update(self, block: np.ndarray) -> bool:
+        """Feed one float32 block; returns True when the utterance is over."""
+        duration = len(block) / self.sample_rate
+        self.elapsed += duration
+        if not self.armed:
+            # Keep the VAD's state running, but wait for a fresh onset
+            speech = self.vad.is_speech(block)
+            self.armed = self.elapsed > self.arm_after and not speech
+            return False
+        if self.vad.is_speech(block):
+            self.speech_time += duration
+            self.silence_time = 0.0
+        elif self.started:
+            self.silence_time += duration
+        return self.started and self.silence_time >= self.hangover
+
+
+def make_vad(kind: str, noise: NoiseFloor, sample_rate: int, block_samples: int,
+             model_path: Optional[str] = None):
+    """Build the configured VAD; falls back to the energy VAD if the model can't load."""
+    if kind == "threshold":
+        return ThresholdVAD()
+    if kind == "onnx":
+        try:
+            return OnnxVAD(model_path, sample_rate, block_samples)
+        except Exception as e:
+            log.warning("ONNX VAD unavailable (%s), using energy VAD", e)
+    elif kind != "energy":
+        raise ValueError(f"Unknown VAD '{kind}', expected energy, onnx or threshold")
+    return EnergyVAD(noise)
@@ -1,73 +1,93 @@
-import os
-import io
 import base64
+import itertools
 import random
 import threading
-from collections import deque
-from typing import List
+import time
+from typing import Dict, List, Optional
 import logging
 
 import numpy as np
-import openwakeword
-from openwakeword.model import Model as WakeWordModel
-import pyaudio
-import sounddevice as sd
-import soundfile as sf
 import requests
 
-from hardware_serial.bridge import SerialBridge
+from audio.capture import AudioCapture
+from audio.dsp import Decimator
+from audio.mixer import Mixer, SoundCache
+from audio.playback import StreamPlayer, response_audio
+from audio.upload import AudioUpload, encode_audio
+from audio.vad import Endpointer, make_vad
+from audio.wake_word import WAKE_WORD_CHUNK_SAMPLES, WAKE_WORD_SAMPLE_RATE, WakeWordDetector
+from config import (
+    VOICE_PREROLL_SECONDS, AUDIO_OUTPUT_RATE, AI_CHAT_URL, AI_STREAM_URL, AI_UPLOAD_MODE, AI_AUDIO_CODEC, AI_TIMEOUT,
+    VAD_BACKEND, VAD_MODEL, VAD_HANGOVER,
+)
+from hardware_serial.ports import PortManager
+from runtime import metrics, startup
 
 log = logging.getLogger("voice_assistant")
-audio_lock = threading.Lock()
-
-# openWakeWord expects 80ms (1280 samples) of mono 16kHz int16 audio per frame
-WAKE_WORD_CHUNK_SAMPLES = 1280
-WAKE_WORD_SAMPLE_RATE = 16000
-
-
-def _resolve_wake_word_model_path(name_or_path: str) -> str:
-    """Resolve a bundled openWakeWord model name or a path to a custom-trained model."""
-    if os.path.exists(name_or_path):
-        return name_or_path
-    if name_or_path not in openwakeword.MODELS:
-        raise FileNotFoundError(
-            f"Unknown wake word model '{name_or_path}'. Pass a path to a "
-            f"custom-trained .onnx/.tflite model, or one of the bundled models: "
-            f"{', '.join(openwakeword.MODELS)}"
-        )
-    model_path = openwakeword.MODELS[name_or_path]["model_path"].replace(".tflite", ".onnx")
-    if not os.path.exists(model_path):
-        log.info("Downloading openWakeWord model '%s'...", name_or_path)
-        openwakeword.utils.download_models([name_or_path])
-    return model_path
-
 
-class VoiceAssistant(threading.Thread):
-    """Voice Assistant system running in its own thread"""
+WAKE_WORD_SECONDS = metrics.Histogram(
+    "bring_wake_word_inference_seconds", "Wake-word model time per 80 ms frame",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.04, 0.08, 0.16),
+)
+WAKE_WORDS = metrics.Counter("bring_wake_word_detections_total", "Wake-word detections",
+                             labelnames=("model",))
+AI_SECONDS = metrics.Histogram("bring_ai_round_trip_seconds", "AI backend request round-trip time")
+AI_ERRORS = metrics.Counter("bring_ai_errors_total", "Failed AI backend requests")
+AI_UPLOAD_BYTES = metrics.Counter("bring_ai_upload_bytes_total", "Encoded audio bytes sent to the AI backend")
+ENDPOINT_LAG = metrics.Histogram("bring_vad_endpoint_seconds",
+                                 "End of speech to end of recording")
+TIME_TO_FIRST_AUDIO = metrics.Histogram("bring_ai_time_to_first_audio_seconds",
+                                        "End of speech to first answer sample played")
+
+CAPTURE_RING_SECONDS = 10
+RECORD_BLOCK_SAMPLES = 1536  # 32 ms at 48 kHz, one 512-sample VAD frame at 16 kHz
+MAX_RECORD_SECONDS = 15.0
+UI_SOUNDS = ("start.wav", "stop.wav", "ready.wav")
+WAITING_MUSIC_DIR = "waiting_musics"
+MUSIC_CROSSFADE_SECONDS = 1.0
+MUSIC_FADE_OUT_SECONDS = 0.3
+
+
+class VoiceAssistant:
+    """Voice Assistant system; run() blocks, so it is given its own thread"""
 
     def __init__(
         self,
-        serial_bridge: SerialBridge,
+        serial_bridge: PortManager,
         wake_word_models: List[str] = ("hey_jarvis",),
         wake_word_threshold: float = 0.5,
+        wake_word_thresholds: Optional[Dict[str, float]] = None,
     ):
-        super().__init__(daemon=True)
         self.serial = serial_bridge
-        self.serial.connect()
 
-        model_paths = [_resolve_wake_word_model_path(m) for m in wake_word_models]
-        self.oww_model = WakeWordModel(wakeword_models=model_paths, inference_framework="onnx")
+        # Models are loaded in run() so that startup isn't held up by ONNX session creation
+        self.wake_word_models = list(wake_word_models)
+        self.detector: Optional[WakeWordDetector] = None
+        self.vad = None
         self.wake_word_threshold = wake_word_threshold
+        self.wake_word_thresholds = wake_word_thresholds or {}
 
-        self.pa = pyaudio.PyAudio()
         self.hardware_rate = 48000
+        # The audio devices are opened in run(): without a microphone or a
+        # speaker only the assistant is lost, not the serial/MQTT bridge
+        self.capture: Optional[AudioCapture] = None
+        # Ring position where the last wake word was detected
+        self.detected_at: Optional[int] = None
+        self.sounds = SoundCache(AUDIO_OUTPUT_RATE)
+        self.mixer: Optional[Mixer] = None
+        self.player: Optional[StreamPlayer] = None
+        self.musics = []
         self.resample_factor = self.hardware_rate // WAKE_WORD_SAMPLE_RATE
+        self.decimator = Decimator(
+            self.resample_factor, WAKE_WORD_CHUNK_SAMPLES * self.resample_factor, self.hardware_rate,
+        )
 
-        log.info("VoiceAssistant ready | wake words: %s | HW: %dHz | Resample: 1/%d",
+        log.info("VoiceAssistant started | wake words: %s | HW: %dHz | Resample: 1/%d",
                  ", ".join(wake_word_models), self.hardware_rate, self.resample_factor)
 
-        self.set_idle()
         self.running = True
+        # Set by stop(); ends an answer being played
+        self.stopped = threading.Event()
 
     def set_idle(self):
         self.serial.write_rgb(0, 100, 0)
@@ -81,80 +101,86 @@ class VoiceAssistant(threading.Thread):
     def set_answering(self):
         self.serial.write_rgb(100, 0, 0)
 
-    def play_ui_sound(self, filename: str):
-        if not os.path.exists(filename):
+    def load_sounds(self):
+        for name in UI_SOUNDS:
+            self.sounds.load(name)
+        self.musics = self.sounds.load_dir(WAITING_MUSIC_DIR)
+        self.mixer.start()
+
+    def play_ui_sound(self, filename: str, wait: bool = False):
+        """Starts the sound and returns, unless `wait` is set."""
+        sound = self.sounds.get(filename)
+        mixer = self.mixer
+        if sound is None or mixer is None:
+            # No sound file, or stop() closed the mixer
             return
-        try:
-            data, fs = sf.read(filename)
-            sd.play(data, fs)
-            sd.wait()
-        except Exception as e:
-            log.warning("UI sound error: %s", e)
+        voice = mixer.play(sound)
+        if wait:
+            voice.done.wait(len(sound) / mixer.rate + 1.0)
 
     def detect_wake_word(self) -> bool:
-        chunk_size = WAKE_WORD_CHUNK_SAMPLES * self.resample_factor
-        stream = self.pa.open(
-            rate=self.hardware_rate,
-            channels=1,
-            format=pyaudio.paInt16,
-            input=True,
-            frames_per_buffer=chunk_size,
-        )
+        pcm = np.empty(WAKE_WORD_CHUNK_SAMPLES * self.resample_factor, dtype=np.int16)
+        reader = self.capture.reader()
         self.set_idle()
+        self.decimator.reset()
         log.info("Listening for wake word...")
         try:
             while self.running:
-                pcm = stream.read(chunk_size, exception_on_overflow=False)
-                pcm = np.frombuffer(pcm, dtype=np.int16)
-                pcm_16khz = pcm[::self.resample_factor]
-                predictions = self.oww_model.predict(pcm_16khz)
-                if any(score >= self.wake_word_threshold for score in predictions.values()):
-                    stream.stop_stream()
-                    stream.close()
-                    self.oww_model.reset()
+                if not reader.read(pcm, timeout=1.0):
+                    continue
+                pcm_16khz = self.decimator.process(pcm)
+                start = time.perf_counter()
+                detected = self.detector.detect(pcm_16khz)
+                WAKE_WORD_SECONDS.observe(time.perf_counter() - start)
+                if detected:
+                    log.info("Wake word: %s", detected)
+                    WAKE_WORDS.labels(detected).inc()
+                    self.detected_at = reader.position
+                    self.detector.reset()
                     return True
-        except Exception:
-            stream.stop_stream()
-            stream.close()
+        except Exception as e:
+            log.warning("Wake word detection error: %s", e)
         return False
 
     # ---------------- RECORDING ---------------- #
-    def record_audio(self):
+    def record_audio(self, upload: Optional[AudioUpload] = None):
+        # Start right where the wake word ended (minus a short pre-roll), so
+        # nothing said while the start sound plays is lost
+        sample_rate = self.hardware_rate
+        start = self.detected_at
+        preroll = 0.0
+        if start is not None:
+            preroll = VOICE_PREROLL_SECONDS
+            start -= int(preroll * sample_rate)
+        reader = self.capture.reader(start)
+
         self.set_recording()
         log.info("Recording...")
         self.play_ui_sound("start.wav")
-
-        sample_rate = 48000
-        blocksize = 2048
-        silence_threshold = 0.035
-        max_silence = 2.0
-        max_duration = 15.0
-
-        audio_buffer = deque()
-        silence_time = 0
-        total_time = 0
-        recording_started = False
-
-        def callback(indata, frames, time_info, status):
-            nonlocal silence_time, total_time, recording_started
-            audio_buffer.append(indata.copy())
-            rms = np.sqrt(np.mean(indata ** 2))
-            if rms > silence_threshold:
-                recording_started = True
-                silence_time = 0
-            elif recording_started:
-                silence_time += frames / sample_rate
-            total_time += frames / sample_rate
-
-        with sd.InputStream(
-            samplerate=sample_rate,
-            channels=1,
-            dtype="float32",
-            blocksize=blocksize,
-            callback=callback,
-        ):
-            while silence_time < max_silence and total_time < max_duration and self.running:
-                sd.sleep(100)
+        prompt = self.sounds.get("start.wav")
+
+        self.vad.reset()
+        # The pre-roll holds the end of the wake word and the mic hears the
+        # prompt: neither may count as the question
+        endpointer = Endpointer(
+            self.vad, sample_rate, hangover=VAD_HANGOVER,
+            arm_after=preroll + (len(prompt) / self.sounds.rate if prompt is not None else 0.0),
+        )
+        audio_buffer = []
+        block = np.empty(RECORD_BLOCK_SAMPLES, dtype=np.int16)
+        max_blocks = int(MAX_RECORD_SECONDS * sample_rate / RECORD_BLOCK_SAMPLES)
+
+        while len(audio_buffer) < max_blocks and self.running:
+            if not reader.read(block, timeout=1.0):
+                break
+            samples = block.astype(np.float32) / 32768
+            audio_buffer.append(samples)
+            if upload:
+                upload.write(samples)
+            if endpointer.update(samples):
+                # How long ago, in real time, the user actually stopped talking
+                ENDPOINT_LAG.observe(endpointer.silence_time + reader.available() / sample_rate)
+                break
 
         self.play_ui_sound("stop.wav")
 
@@ -168,82 +194,145 @@ class VoiceAssistant(threading.Thread):
             audio *= 0.9 / peak
         return audio, sample_rate
 
-    def process_with_ai(self, wav_path: str):
+    def _start_upload(self) -> Optional[AudioUpload]:
+        if AI_UPLOAD_MODE != "stream":
+            return None
+        try:
+            return AudioUpload(AI_STREAM_URL, self.hardware_rate, AI_AUDIO_CODEC, AI_TIMEOUT)
+        except Exception as e:
+            log.warning("Streaming upload unavailable, sending after recording: %s", e)
+            return None
+
+    def process_with_ai(self, audio: np.ndarray, sample_rate: int,
+                        upload: Optional[AudioUpload] = None):
         self.set_processing()
         log.info("Processing audio via AI...")
 
         stop_music = threading.Event()
-        #
-        def waiting_music_loop():
-            musics = [
-                os.path.join("waiting_musics", f)
-                for f in os.listdir("waiting_musics")
-                if f.endswith((".wav", ".flac"))
-            ]
-            if not musics:
-                return
+        mixer = self.mixer
+        if mixer is None:
+            return
 
-            while not stop_music.is_set():
-                music_file = random.choice(musics)
-                try:
-                    data, fs = sf.read(music_file, dtype="float32")
-                    with audio_lock:
-                        sd.play(data, fs)
-                    while sd.get_stream().active and not stop_music.is_set():
-                        sd.sleep(100)
-                    sd.stop()
-                except Exception as e:
-                    log.warning("Waiting music error: %s", e)
+        def waiting_music_loop():
+            # Each track crossfades into the next until the answer arrives
+            while self.musics and not stop_music.is_set():
+                music = self.sounds.get(random.choice(self.musics))
+                mixer.crossfade(music, "music", MUSIC_CROSSFADE_SECONDS)
+                stop_music.wait(max(len(music) / mixer.rate - MUSIC_CROSSFADE_SECONDS, 0.1))
+            mixer.fade_out("music", MUSIC_FADE_OUT_SECONDS)
 
         music_thread = threading.Thread(target=waiting_music_loop, daemon=True)
         music_thread.start()
 
         try:
-            with open(wav_path, "rb") as f:
-                audio_b64 = base64.b64encode(f.read()).decode()
-
-            response = requests.post(
-                "http://206.167.46.66:3000/ia/chat/audio",
-                json={"content": audio_b64},
-                timeout=60,
-            )
-
-            stop_music.set()
-            sd.stop()
-            music_thread.join()
+            start = time.perf_counter()
+            if upload:
+                # Most of the audio is already there; this sends the tail
+                response = upload.finish()
+                AI_UPLOAD_BYTES.inc(upload.bytes_sent)
+            else:
+                content, _ = encode_audio(audio, sample_rate, AI_AUDIO_CODEC)
+                AI_UPLOAD_BYTES.inc(len(content))
+                response = requests.post(
+                    AI_CHAT_URL,
+                    json={"content": base64.b64encode(content).decode(), "format": AI_AUDIO_CODEC},
+                    timeout=AI_TIMEOUT,
+                    stream=True,
+                )
+            AI_SECONDS.observe(time.perf_counter() - start)
 
             if not response.ok:
+                stop_music.set()
                 log.warning("Server error")
+                AI_ERRORS.inc()
                 self.set_idle()
                 return
 
-            audio_out_b64 = response.json().get("content")
-            if not audio_out_b64:
+            # Keep the music going until the first block of the answer is decoded
+            rate, blocks = response_audio(response)
+            first_block = next(blocks, None)
+
+            stop_music.set()
+            music_thread.join()
+
+            if first_block is None:
                 self.set_idle()
                 return
 
-            data, sr = sf.read(io.BytesIO(base64.b64decode(audio_out_b64)), dtype="int16")
             self.set_answering()
-            self.play_ui_sound("ready.wav")
-            sd.play(data, sr)
-            sd.wait()
+            self.play_ui_sound("ready.wav", wait=True)
+            first_audio_at = self.player.play(rate, itertools.chain((first_block,), blocks),
+                                              stop=self.stopped)
+            if first_audio_at is not None:
+                TIME_TO_FIRST_AUDIO.observe(first_audio_at - start)
+                log.info("Time to first audio: %.0f ms", 1000 * (first_audio_at - start))
             self.set_idle()
 
         except Exception as e:
+            stop_music.set()
             log.warning("AI processing error: %s", e)
+            AI_ERRORS.inc()
             self.set_idle()
 
+    def open_audio(self):
+        self.capture = AudioCapture(self.hardware_rate, CAPTURE_RING_SECONDS)
+        self.capture.start()
+        self.mixer = Mixer(AUDIO_OUTPUT_RATE)
+        self.player = StreamPlayer(self.mixer)
+
+    def close_audio(self):
+        capture, self.capture = self.capture, None
+        mixer, self.mixer = self.mixer, None
+        if capture:
+            capture.stop()
+        if mixer:
+            mixer.close()
+
     def run(self):
+        self.serial.connect()
+        self.set_idle()
+        try:
+            self.open_audio()
+            self.load_sounds()
+        except Exception as e:
+            log.error("Could not open the audio devices, voice assistant disabled: %s", e)
+            self.close_audio()
+            return
+        try:
+            self.detector = WakeWordDetector(
+                self.wake_word_models, self.wake_word_threshold, self.wake_word_thresholds,
+            )
+            self.vad = make_vad(VAD_BACKEND, self.capture.noise, self.hardware_rate,
+                                RECORD_BLOCK_SAMPLES, VAD_MODEL)
+        except Exception as e:
+            log.error("Could not load wake-word models, voice assistant disabled: %s", e)
+            self.close_audio()
+            return
+        startup.mark("wake_word_ready")
+
         while self.running:
-            if self.detect_wake_word():
-                result = self.record_audio()
-                if result:
-                    audio, sr = result
-                    sf.write("audio.wav", audio, sr, subtype="PCM_16")
-                    self.process_with_ai("audio.wav")
+            try:
+                self.converse()
+            except Exception as e:
+                if not self.running:
+                    # stop() closed the devices under this turn
+                    break
+                log.exception("Voice assistant turn failed: %s", e)
+
+    def converse(self):
+        """One turn: wait for the wake word, record the question, play the answer."""
+        if self.detect_wake_word():
+            upload = self._start_upload()
+            result = self.record_audio(upload)
+            if result:
+                audio, sr = result
+                self.process_with_ai(audio, sr, upload)
+            elif upload:
+                upload.abort()
 
     def stop(self):
         self.running = False
+        self.stopped.set()
         self.serial.close()
-        self.pa.terminate()
+        self.close_audio()
 
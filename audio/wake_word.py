@@ -0,0 +1,213 @@
+"""
+openWakeWord model loading.
+
+Models (and openWakeWord's shared melspectrogram/embedding models) are read
+from a local cache directory. They are downloaded into it only when missing,
+so once the device is provisioned startup never touches the network:
+
+    python -m audio.wake_word [model ...]
+"""
+import contextlib
+import functools
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import openwakeword
+from openwakeword.model import Model as WakeWordModel
+from openwakeword.utils import download_file, download_models
+
+from config import (
+    WAKE_WORD_MODEL_DIR, WAKE_WORD_MODELS, WAKE_WORD_OPT_LEVEL, WAKE_WORD_THREADS,
+    WAKE_WORD_THRESHOLD, WAKE_WORD_THRESHOLDS,
+)
+
+log = logging.getLogger("voice_assistant")
+
+# openWakeWord expects 80ms (1280 samples) of mono 16kHz int16 audio per frame
+WAKE_WORD_CHUNK_SAMPLES = 1280
+WAKE_WORD_SAMPLE_RATE = 16000
+
+FEATURE_MODELS = ("melspectrogram", "embedding")
+OPT_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def _onnx_name(model_path: str) -> str:
+    return os.path.basename(model_path).replace(".tflite", ".onnx")
+
+
+def resolve_model_path(name_or_path: str, cache_dir: str = WAKE_WORD_MODEL_DIR) -> str:
+    """Resolve a bundled openWakeWord model name or a path to a custom-trained model."""
+    if os.path.exists(name_or_path):
+        return name_or_path
+    if name_or_path not in openwakeword.MODELS:
+        raise FileNotFoundError(
+            f"Unknown wake word model '{name_or_path}'. Pass a path to a "
+            f"custom-trained .onnx/.tflite model, or one of the bundled models: "
+            f"{', '.join(openwakeword.MODELS)}"
+        )
+    model_path = os.path.join(cache_dir, _onnx_name(openwakeword.MODELS[name_or_path]["model_path"]))
+    if not os.path.exists(model_path):
+        log.info("Downloading openWakeWord model '%s' to %s...", name_or_path, cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        download_models([name_or_path], target_directory=cache_dir)
+    return model_path
+
+
+def feature_model_paths(cache_dir: str = WAKE_WORD_MODEL_DIR) -> List[str]:
+    paths = []
+    for name in FEATURE_MODELS:
+        info = openwakeword.FEATURE_MODELS[name]
+        path = os.path.join(cache_dir, _onnx_name(info["model_path"]))
+        if not os.path.exists(path):
+            # download_models() with no names would fetch every bundled model
+            log.info("Downloading openWakeWord %s model to %s...", name, cache_dir)
+            os.makedirs(cache_dir, exist_ok=True)
+            download_file(info["download_url"].replace(".tflite", ".onnx"), cache_dir)
+        paths.append(path)
+    return paths
+
+
+def create_session(model_path: str, cache_dir: str = WAKE_WORD_MODEL_DIR,
+                   threads: int = WAKE_WORD_THREADS, opt_level: str = WAKE_WORD_OPT_LEVEL,
+                   session_class=None):
+    """
+    ONNX Runtime session with our thread count and optimization level. The
+    optimized graph is saved to the cache and loaded as-is on later starts.
+    """
+    import onnxruntime as ort
+
+    session_class = session_class or ort.InferenceSession
+
+    if opt_level not in OPT_LEVELS:
+        raise ValueError(f"Unknown optimization level '{opt_level}', expected {', '.join(OPT_LEVELS)}")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    providers = ["CPUExecutionProvider"]
+
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    optimized = os.path.join(cache_dir, f"{stem}.{opt_level}.optimized.onnx")
+    if opt_level != "disable" and os.path.exists(optimized) \
+            and os.path.getmtime(optimized) >= os.path.getmtime(model_path):
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return session_class(optimized, sess_options=options, providers=providers)
+        except Exception as e:
+            # Written by another onnxruntime version, most likely
+            log.warning("Ignoring cached %s: %s", optimized, e)
+
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, OPT_LEVELS[opt_level])
+    if opt_level != "disable":
+        os.makedirs(cache_dir, exist_ok=True)
+        options.optimized_model_filepath = optimized
+    return session_class(model_path, sess_options=options, providers=providers)
+
+
+def _run_session(session, input_name: str, x: np.ndarray):
+    return session.run(None, {input_name: x})
+
+
+@contextlib.contextmanager
+def _tuned_sessions(cache_dir: str, threads: int, opt_level: str):
+    """
+    Have openWakeWord build our sessions instead of its own (one thread,
+    default optimization). Model and AudioFeatures create every session
+    through onnxruntime.InferenceSession(path, ...), so each model is loaded
+    once. Not thread-safe: nothing else may create sessions meanwhile.
+    """
+    import onnxruntime as ort
+
+    stock = ort.InferenceSession
+
+    def tuned(path, *args, **kwargs):
+        return create_session(path, cache_dir, threads, opt_level, session_class=stock)
+
+    ort.InferenceSession = tuned
+    try:
+        yield
+    finally:
+        ort.InferenceSession = stock
+
+
+def _cache_input_names(model: WakeWordModel):
+    """openWakeWord looks each model's input name up again on every frame."""
+    for key, session in model.models.items():
+        model.model_prediction_function[key] = functools.partial(
+            _run_session, session, session.get_inputs()[0].name,
+        )
+
+
+def load_wake_word_model(models: Sequence[str], cache_dir: str = WAKE_WORD_MODEL_DIR,
+                         threads: int = WAKE_WORD_THREADS, opt_level: Optional[str] = WAKE_WORD_OPT_LEVEL,
+                         ) -> WakeWordModel:
+    """Build the model from the cache and warm it up. opt_level=None keeps openWakeWord's sessions."""
+    start = time.perf_counter()
+    model_paths = [resolve_model_path(m, cache_dir) for m in models]
+    feature_paths = feature_model_paths(cache_dir)
+    tuned = _tuned_sessions(cache_dir, threads, opt_level) if opt_level is not None else contextlib.nullcontext()
+    with tuned:
+        model = WakeWordModel(
+            wakeword_models=model_paths,
+            inference_framework="onnx",
+            melspec_model_path=feature_paths[0],
+            embedding_model_path=feature_paths[1],
+            ncpu=threads,
+        )
+    if opt_level is not None:
+        _cache_input_names(model)
+    loaded = time.perf_counter()
+    warm_up(model)
+    log.info("Wake-word models loaded in %.0f ms, warmed up in %.0f ms",
+             1000 * (loaded - start), 1000 * (time.perf_counter() - loaded))
+    return model
+
+
+class WakeWordDetector:
+    """All wake-word models behind one shared feature extractor, each with its own threshold."""
+
+    def __init__(self, models: Sequence[str], threshold: float = WAKE_WORD_THRESHOLD,
+                 thresholds: Optional[Dict[str, float]] = None, cache_dir: str = WAKE_WORD_MODEL_DIR):
+        thresholds = WAKE_WORD_THRESHOLDS if thresholds is None else thresholds
+        self.model = load_wake_word_model(models, cache_dir)
+        # openWakeWord keys predictions by model file name, in the order given
+        self.thresholds = [
+            (key, thresholds.get(name, threshold)) for name, key in zip(models, self.model.models)
+        ]
+        log.info("Wake-word thresholds: %s",
+                 ", ".join(f"{key}={value:.2f}" for key, value in self.thresholds))
+
+    def detect(self, pcm_16khz: np.ndarray) -> Optional[str]:
+        """Feed one 80 ms frame; returns the name of the model that triggered, if any."""
+        predictions = self.model.predict(pcm_16khz)
+        for key, threshold in self.thresholds:
+            if predictions[key] >= threshold:
+                return key
+        return None
+
+    def reset(self):
+        self.model.reset()
+
+
+def warm_up(model: WakeWordModel):
+    """
+    Run one frame of silence through every session, so ONNX Runtime's lazy
+    allocations happen now instead of on the first frame of real audio.
+    """
+    model.predict(np.zeros(WAKE_WORD_CHUNK_SAMPLES, dtype=np.int16))
+    model.reset()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for path in [resolve_model_path(m) for m in sys.argv[1:] or WAKE_WORD_MODELS] + feature_model_paths():
+        print(path)
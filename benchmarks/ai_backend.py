@@ -0,0 +1,203 @@
+"""
+Voice upload benchmark against a local stand-in for the AI backend.
+
+Plays a synthetic utterance in real time through the "json" path (encode and
+POST after the user stops talking) and the "stream" path (AudioUpload while
+talking), over an uplink throttled to --uplink-kbps. Reports bytes sent and
+the time from end of speech to the response, to the first decoded answer
+block, and to the end of the answer. The answer is generated at --tts-speed
+times real time, either as one JSON document (--reply json) or streamed
+(--reply wav / pcm).
+
+    python -m benchmarks.ai_backend [--seconds 5] [--codec opus] [--uplink-kbps 1000]
+                                    [--reply json] [--tts-speed 4]
+"""
+import argparse
+import base64
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import soundfile as sf
+import requests
+
+from audio.playback import response_audio
+from audio.upload import AudioUpload, encode_audio
+
+SAMPLE_RATE = 48000
+BLOCK = 2048
+REPLY_RATE = 24000
+REPLY_SECONDS = 6.0
+
+
+def reply_audio(seconds: float = REPLY_SECONDS, rate: int = REPLY_RATE) -> bytes:
+    t = np.arange(int(seconds * rate)) / rate
+    buf = io.BytesIO()
+    sf.write(buf, 0.3 * np.sin(2 * np.pi * 440 * t), rate, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+class AIBackendStub(ThreadingHTTPServer):
+    """
+    Accepts /ia/chat/audio (JSON) and /ia/chat/audio/stream (chunked) uploads
+    and answers with `reply` ("json", "wav" or "pcm"), produced at `tts_speed`
+    times real time like a speech synthesizer would.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, uplink_kbps: float = 0.0, reply: str = "json", tts_speed: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.uplink_bytes_per_sec = uplink_kbps * 1000 / 8
+        self.reply_mode = reply
+        self.tts_speed = tts_speed
+        self.reply = reply_audio()
+        self.received = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/ia/chat/audio"
+
+    def throttle(self, nbytes: int):
+        if self.uplink_bytes_per_sec:
+            time.sleep(nbytes / self.uplink_bytes_per_sec)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return bytes(body)
+                chunk = self.rfile.read(size)
+                self.rfile.readline()
+                self.server.throttle(size)
+                body += chunk
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.throttle(len(body))
+        return body
+
+    def do_POST(self):
+        body = self._read_body()
+        self.server.received += len(body)
+        mode = self.server.reply_mode
+        if mode == "json":
+            self._synthesize(len(self.server.reply))
+            self._send_json({"content": base64.b64encode(self.server.reply).decode()})
+            return
+
+        reply = self.server.reply if mode == "wav" else self.server.reply[44:]
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav" if mode == "wav"
+                         else f"audio/pcm; rate={REPLY_RATE}; channels=1")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        step = REPLY_RATE // 10 * 2  # 100 ms of audio per chunk
+        for i in range(0, len(reply), step):
+            chunk = reply[i:i + step]
+            self._synthesize(len(chunk))
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _synthesize(self, nbytes: int):
+        if self.server.tts_speed:
+            time.sleep(nbytes / 2 / REPLY_RATE / self.server.tts_speed)
+
+    def _send_json(self, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def utterance(seconds: float) -> np.ndarray:
+    """Speech-like test signal: a few harmonics under a syllable-rate envelope."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 720, 1440)))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))
+    noise = np.random.default_rng(0).normal(0, 0.02, len(t))
+    return (0.2 * voice * envelope + noise).astype(np.float32)
+
+
+def speak(audio: np.ndarray, on_block):
+    """Deliver blocks at the pace a microphone would."""
+    start = time.monotonic()
+    for i in range(0, len(audio), BLOCK):
+        delay = start + i / SAMPLE_RATE - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        on_block(audio[i:i + BLOCK])
+
+
+def receive(response: requests.Response, end_of_speech: float):
+    """Times (response, first decoded block, whole answer) from end of speech."""
+    response.raise_for_status()
+    responded = time.perf_counter() - end_of_speech
+    _, blocks = response_audio(response)
+    first = None
+    for _ in blocks:
+        if first is None:
+            first = time.perf_counter() - end_of_speech
+    return responded, first, time.perf_counter() - end_of_speech
+
+
+def run_json(url: str, audio: np.ndarray, codec: str):
+    speak(audio, lambda block: None)
+    end_of_speech = time.perf_counter()
+    content, _ = encode_audio(audio, SAMPLE_RATE, codec)
+    response = requests.post(url, json={"content": base64.b64encode(content).decode()},
+                             timeout=60, stream=True)
+    return len(content), receive(response, end_of_speech)
+
+
+def run_stream(url: str, audio: np.ndarray, codec: str):
+    upload = AudioUpload(url + "/stream", SAMPLE_RATE, codec, timeout=60)
+    speak(audio, upload.write)
+    end_of_speech = time.perf_counter()
+    response = upload.finish()
+    return upload.bytes_sent, receive(response, end_of_speech)
+
+
+def report(label: str, size: int, timings):
+    responded, first, done = timings
+    print(f"  {label:<12} {size / 1024:8.1f} KiB  response {1000 * responded:7.1f} ms  "
+          f"first audio {1000 * first:7.1f} ms  answer complete {1000 * done:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=5.0, help="utterance length")
+    parser.add_argument("--codec", default="opus")
+    parser.add_argument("--uplink-kbps", type=float, default=1000.0)
+    parser.add_argument("--reply", choices=("json", "wav", "pcm"), default="json")
+    parser.add_argument("--tts-speed", type=float, default=4.0, help="x real time, 0 = instant")
+    args = parser.parse_args()
+
+    server = AIBackendStub(args.uplink_kbps, args.reply, args.tts_speed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    audio = utterance(args.seconds)
+
+    print(f"{args.seconds:.0f}s utterance, uplink {args.uplink_kbps:.0f} kbit/s, "
+          f"{REPLY_SECONDS:.0f}s {args.reply} answer at {args.tts_speed}x real time "
+          f"(times from end of speech)")
+    for codec in ("wav", args.codec):
+        report(f"json {codec}", *run_json(server.url, audio, codec))
+    report(f"stream {args.codec}", *run_stream(server.url, audio, args.codec))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Camera upload benchmark against a local stand-in for the frame backend.
+
+Feeds synthetic frames through CameraStreamer into a local HTTP sink and
+reports the FPS achieved at the sink and capture-to-sink frame latency.
+--delay makes the sink slow to show stale frames being dropped and the
+JPEG quality/resolution adapting. --mjpeg makes the fake camera deliver
+JPEGs, like V4L2 MJPEG capture, to compare CPU per frame with passthrough.
+--static films an unchanging scene, to use with --change-threshold.
+
+    python -m benchmarks.camera_upload [--seconds 10] [--delay 0.0] [--mjpeg]
+                                       [--static] [--change-threshold 0]
+"""
+import argparse
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from camera import streamer
+from camera.streamer import CameraStreamer
+
+
+class FrameSink(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float):
+        super().__init__(("127.0.0.1", 0), _SinkHandler)
+        self.delay = delay
+        self.latencies = []
+        self.bytes = 0
+        self.connections = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/camera/frame"
+
+
+class _SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.server.bytes += len(body)
+        captured_at = self.headers.get("X-Frame-Timestamp")
+        if captured_at:
+            self.server.latencies.append(time.time() - float(captured_at))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeCapture:
+    """Stands in for cv2.VideoCapture, producing noisy frames at the configured FPS."""
+
+    def __init__(self, width: int, height: int, fps: float, mjpeg: bool, static: bool):
+        rng = np.random.default_rng(0)
+        self.frames = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+                       for _ in range(1 if static else 8)]
+        if mjpeg:
+            self.frames = [cv2.imencode(".jpg", f)[1].reshape(1, -1) for f in self.frames]
+        self.period = 1 / fps
+        self.count = 0
+        self.next_frame = time.monotonic()
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        delay = self.next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame += self.period
+        self.count += 1
+        return True, self.frames[self.count % len(self.frames)]
+
+    def release(self):
+        pass
+
+
+class BenchStreamer(CameraStreamer):
+    static = False
+
+    def _open_capture(self):
+        return FakeCapture(streamer.CAMERA_WIDTH, streamer.CAMERA_HEIGHT, streamer.CAMERA_FPS,
+                           self.mjpeg, self.static)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--delay", type=float, default=0.0, help="sink processing delay (s)")
+    parser.add_argument("--mjpeg", action="store_true", help="camera delivers JPEG (passthrough)")
+    parser.add_argument("--static", action="store_true", help="unchanging scene")
+    parser.add_argument("--change-threshold", type=float, default=0.0)
+    args = parser.parse_args()
+
+    sink = FrameSink(args.delay)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+    BenchStreamer.static = args.static
+    camera = BenchStreamer(url=sink.url, mjpeg=args.mjpeg, change_threshold=args.change_threshold)
+    cpu_start = time.process_time()
+    threading.Thread(target=camera.run, daemon=True).start()
+    time.sleep(args.seconds)
+    camera.stop()
+    cpu = time.process_time() - cpu_start
+    sink.shutdown()
+
+    latencies = sorted(sink.latencies)
+    received = len(latencies)
+    print(f"target fps      {streamer.CAMERA_FPS}")
+    print(f"received fps    {received / args.seconds:.1f}")
+    print(f"connections     {sink.connections}")
+    print(f"cpu per frame   {1000 * cpu / max(received, 1):.1f} ms (whole process)")
+    print(f"stale dropped   {streamer.FRAMES_STALE.value:.0f}")
+    print(f"upload failures {streamer.FRAMES_FAILED.value:.0f}")
+    print(f"unchanged       {streamer.FRAMES_UNCHANGED.value:.0f}")
+    print(f"uploaded        {sink.bytes / 1024 / args.seconds:.0f} KiB/s")
+    print(f"capture fps     {camera.scheduler.achieved_fps:.1f} "
+          f"(jitter {1000 * camera.scheduler.jitter:.1f} ms, skipped {camera.scheduler.skipped})")
+    print(f"final quality   {camera.quality.quality} at scale {camera.quality.scale:.2f}")
+    if latencies:
+        print(f"latency p50     {1000 * statistics.median(latencies):.1f} ms")
+        print(f"latency p99     {1000 * latencies[int(0.99 * (received - 1))]:.1f} ms")
+        print(f"avg frame size  {sink.bytes / received / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Cost of the metrics calls used on the hot paths.
+
+Reports nanoseconds per call for each kind of update, and the decode cost per
+serial packet with and without the per-packet counter for comparison.
+
+    python -m benchmarks.metrics_overhead [--iterations 1000000]
+"""
+import argparse
+import time
+
+from hardware_serial.framing import FrameDecoder
+from hardware_serial.reader import DTYPE_LABELS
+from runtime import metrics
+
+
+def per_call_ns(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def decode_ns_per_packet(iterations: int, counter=None) -> float:
+    decoder = FrameDecoder(reverse=True)
+    children = [None] * 256
+    chunk = b"".join(bytes([i % 8, 8]) + bytes(6) for i in range(64))
+    rounds = max(1, iterations // 64)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for packet in decoder.feed(chunk):
+            if counter is not None:
+                # Same cached-child lookup as SerialReader._count
+                child = children[packet[0]]
+                if child is None:
+                    child = children[packet[0]] = counter.labels(DTYPE_LABELS[packet[0]])
+                child.inc()
+    return (time.perf_counter() - start) / (rounds * 64) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    registry = metrics.Registry()
+    counter = metrics.Counter("bench_total", "", registry=registry)
+    labelled = metrics.Counter("bench_labelled_total", "", ["dtype"], registry=registry)
+    histogram = metrics.Histogram("bench_seconds", "", registry=registry)
+    child = counter.labels()
+
+    baseline = per_call_ns(lambda: None, n)
+    print(f"empty call               {baseline:7.1f} ns")
+    print(f"counter child inc        {per_call_ns(child.inc, n) - baseline:7.1f} ns")
+    print(f"unlabelled counter inc   {per_call_ns(counter.inc, n) - baseline:7.1f} ns")
+    print(f"labels(dtype).inc        "
+          f"{per_call_ns(lambda: labelled.labels('0A').inc(), n) - baseline:7.1f} ns")
+    print(f"histogram observe        "
+          f"{per_call_ns(lambda: histogram.observe(0.003), n) - baseline:7.1f} ns")
+    print(f"perf_counter pair        "
+          f"{per_call_ns(lambda: time.perf_counter() - time.perf_counter(), n) - baseline:7.1f} ns")
+
+    plain = decode_ns_per_packet(n)
+    counted = decode_ns_per_packet(n, labelled)
+    print(f"decode per packet        {plain:7.1f} ns")
+    print(f"decode + packet counter  {counted:7.1f} ns (+{100 * (counted - plain) / plain:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
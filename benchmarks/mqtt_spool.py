@@ -0,0 +1,82 @@
+"""
+MQTT outage spool throughput.
+
+Appends --messages readings to a spool in --dir (put it on the SD card to
+measure that), timing the appends alone and including the msync that gets
+them onto storage. Then reopens the spool, as after a restart, and drains
+it through MQTTBridge into the MQTT stand-in, which acknowledges every QoS 1
+PUBLISH, until the persisted cursor reaches the end.
+
+    python -m benchmarks.mqtt_spool --dir /mnt/sd/spool-bench [--messages 200000] [--payload 8]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.mqtt_standin import MQTTStandIn
+from mqtt.bridge import MQTTBridge
+from mqtt.spool import Spool
+
+
+def append(args) -> float:
+    spool = Spool(args.dir, args.max_mb * 1024 * 1024, args.segment_mb * 1024 * 1024)
+    payload = os.urandom(args.payload).hex()
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        spool.append("device/ttyACM0/11", payload)
+    appended = time.perf_counter() - start
+    spool.close()
+    synced = time.perf_counter() - start
+    size = sum(segment.end for segment in spool.segments.values())
+    print(f"append: {args.messages / appended:,.0f} msg/s ({size / appended / 1e6:.1f} MB/s) in page cache, "
+          f"{args.messages / synced:,.0f} msg/s ({size / synced / 1e6:.1f} MB/s) including msync")
+    return size
+
+
+async def drain(args):
+    received = []
+    standin = MQTTStandIn(lambda topic, payload, at: received.append(at))
+    port = await standin.start()
+    bridge = MQTTBridge(None, spool_dir=args.dir)
+    bridge.connect_asyncio(asyncio.get_running_loop(), "127.0.0.1", port)
+    drainer = asyncio.get_running_loop().create_task(bridge.drain_spool(args.rate, args.inflight))
+    spool = bridge.spool
+    end = (spool._head.number, spool._head.end)
+    start = time.perf_counter()
+    while spool.cursor < end:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    drainer.cancel()
+    await bridge.close_async()
+    standin.close()
+    print(f"drain:  {len(received) / elapsed:,.0f} msg/s acknowledged "
+          f"(rate {args.rate or 'unlimited'}, {args.inflight} in flight), {len(received)} received")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dir", help="spool directory (default: a temporary one)")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--payload", type=int, default=8, help="reading size in bytes, sent as hex")
+    parser.add_argument("--max-mb", type=int, default=64)
+    parser.add_argument("--segment-mb", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0, help="drain messages/s, 0 = unlimited")
+    parser.add_argument("--inflight", type=int, default=20)
+    args = parser.parse_args()
+    temporary = args.dir is None
+    args.dir = args.dir or tempfile.mkdtemp(prefix="bring-spool-")
+    if os.listdir(args.dir):
+        parser.error(f"{args.dir} is not empty")
+    try:
+        append(args)
+        asyncio.run(drain(args))
+    finally:
+        if temporary:
+            shutil.rmtree(args.dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Minimal MQTT 3.1.1 broker stand-in for benchmarks: accepts any client,
+acknowledges CONNECT, SUBSCRIBE, PINGREQ and QoS 1 PUBLISH, and hands every
+PUBLISH to a callback instead of routing it. Not a broker.
+"""
+import asyncio
+import time
+from typing import Callable, Optional
+
+CONNECT, CONNACK, PUBLISH, PUBACK, SUBSCRIBE, SUBACK, PINGREQ, PINGRESP, DISCONNECT = \
+    1, 2, 3, 4, 8, 9, 12, 13, 14
+
+
+class MQTTStandIn:
+    def __init__(self, on_publish: Callable[[str, bytes, float], None], host: str = "127.0.0.1",
+                 port: int = 0, ack_qos1: bool = True):
+        self.on_publish = on_publish
+        self.host = host
+        self.port = port
+        self.ack_qos1 = ack_qos1
+        self.server: Optional[asyncio.base_events.Server] = None
+        self.received = 0
+
+    async def start(self) -> int:
+        """Starts listening; returns the port (an ephemeral one if port was 0)."""
+        self.server = await asyncio.start_server(self._client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    def close(self):
+        if self.server:
+            self.server.close()
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                first = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length)
+                received_at = time.perf_counter()
+                kind, flags = first[0] >> 4, first[0] & 0x0F
+                if kind == CONNECT:
+                    writer.write(bytes((CONNACK << 4, 2, 0, 0)))
+                elif kind == PUBLISH:
+                    self._publish(flags, body, writer, received_at)
+                elif kind == SUBSCRIBE:
+                    # Grant QoS 0 to every filter
+                    filters = 0
+                    offset = 2
+                    while offset < len(body):
+                        offset += 2 + int.from_bytes(body[offset:offset + 2], "big") + 1
+                        filters += 1
+                    writer.write(bytes((SUBACK << 4, 2 + filters)) + body[:2] + bytes(filters))
+                elif kind == PINGREQ:
+                    writer.write(bytes((PINGRESP << 4, 0)))
+                elif kind == DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _publish(self, flags: int, body: bytes, writer: asyncio.StreamWriter, received_at: float):
+        qos = (flags >> 1) & 3
+        topic_len = int.from_bytes(body[:2], "big")
+        topic = body[2:2 + topic_len].decode()
+        offset = 2 + topic_len
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            if self.ack_qos1:
+                writer.write(bytes((PUBACK << 4, 2)) + packet_id)
+        self.received += 1
+        self.on_publish(topic, body[offset:], received_at)
@@ -0,0 +1,103 @@
+"""
+Serial decoder micro-benchmark.
+
+Serves synthetic packets through a pseudo-terminal paced at the given line
+rates (10 bits per byte on the wire) and reports how many packets/s the
+SerialBridge read path decodes, next to the raw FrameDecoder throughput.
+
+    python -m benchmarks.serial_decoder [--seconds 3] [--payload 6]
+"""
+import argparse
+import os
+import threading
+import time
+import tty
+
+import serial
+
+from hardware_serial.bridge import SerialBridge
+from hardware_serial.framing import FrameDecoder
+
+BAUDRATES = (9600, 115200, 1_000_000)
+
+
+def make_stream(payload_len: int, count: int) -> bytes:
+    packet_size = payload_len + 2
+    return b"".join(
+        bytes([i % 256, packet_size]) + bytes(payload_len) for i in range(count)
+    )
+
+
+def fake_device(fd: int, stream: bytes, baudrate: int, stop: threading.Event):
+    """Write the stream to the pty master at the line rate of `baudrate`."""
+    bytes_per_sec = baudrate / 10
+    chunk = max(1, int(bytes_per_sec / 1000))  # ~1 ms worth of bytes
+    start = time.monotonic()
+    sent = 0
+    while not stop.is_set():
+        offset = sent % len(stream)
+        data = stream[offset:offset + chunk]
+        os.write(fd, data)
+        sent += len(data)
+        delay = start + sent / bytes_per_sec - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def bench_port(baudrate: int, payload_len: int, seconds: float) -> float:
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    stop = threading.Event()
+    writer = threading.Thread(
+        target=fake_device,
+        args=(master, make_stream(payload_len, 256), baudrate, stop),
+        daemon=True,
+    )
+
+    bridge = SerialBridge(baudrate)
+    bridge.ser = serial.Serial(os.ttyname(slave), baudrate, timeout=0.1)
+    writer.start()
+
+    packets = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        packets += len(bridge.read_packets())
+
+    stop.set()
+    writer.join()
+    bridge.close()
+    os.close(master)
+    os.close(slave)
+    return packets / seconds
+
+
+def bench_decoder(payload_len: int, seconds: float) -> float:
+    decoder = FrameDecoder()
+    stream = make_stream(payload_len, 1000)
+    chunks = [stream[i:i + 64] for i in range(0, len(stream), 64)]
+    packets = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for chunk in chunks:
+            packets += len(decoder.feed(chunk))
+    return packets / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--payload", type=int, default=6, help="payload bytes per packet")
+    args = parser.parse_args()
+
+    packet_size = args.payload + 2
+    print(f"packet size: {packet_size} bytes")
+    for baudrate in BAUDRATES:
+        line_rate = baudrate / 10 / packet_size
+        rate = bench_port(baudrate, args.payload, args.seconds)
+        print(f"{baudrate:>9} baud: {rate:>10.0f} packets/s "
+              f"(line rate {line_rate:.0f}, {100 * rate / line_rate:.0f}%)")
+    print(f"  decoder only: {bench_decoder(args.payload, args.seconds):>10.0f} packets/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+End-to-end UART -> MQTT benchmark.
+
+A child process plays one or more PCBs (synthetic traffic, or a recording
+made with `python -m hardware_serial.recording record`) on pseudo-terminals
+and runs an MQTT stand-in. This process runs the real forwarding path:
+PortManager (a SerialBridge and event-loop SerialReader per board),
+Publisher (direct) and MQTTBridge on the asyncio paho adapter. Reports
+packets/s delivered, p50/p99 latency from the pty write to the stand-in
+receiving the PUBLISH (synthetic traffic only), and this process's CPU time
+per packet.
+
+    python -m benchmarks.serial_e2e [--speed 0] [--boards 2] [--mix 11:2000,12:500] [--recording FILE]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+import numpy as np
+
+from hardware_serial.recording import Replayer, parse_mix, read_recording, synthetic_traffic
+
+BAUDRATE = 115200
+
+
+def simulator(conn, args):
+    """Child process: one pty replayer per board plus the MQTT stand-in; sends back latencies."""
+    from benchmarks.mqtt_standin import MQTTStandIn
+
+    if args.recording:
+        _, chunks = read_recording(args.recording)
+        replayers = [Replayer(chunks, args.speed) for _ in range(args.boards)]
+    else:
+        replayers = [
+            Replayer(synthetic_traffic(parse_mix(args.mix), args.payload), args.speed, record_times=True)
+            for _ in range(args.boards)
+        ]
+    received = []
+
+    def on_publish(topic, payload, received_at):
+        # device/b{board}/{dtype}
+        replayer = replayers[int(topic.split("/")[1][1:])]
+        if replayer.write_times is not None:
+            seq = int.from_bytes(bytes.fromhex(payload[:8].decode()), "big")
+            received.append(received_at - replayer.write_times[seq])
+        else:
+            received.append(0.0)
+
+    async def serve():
+        standin = MQTTStandIn(on_publish)
+        port = await standin.start()
+        conn.send(([r.path for r in replayers], port))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, conn.recv)  # "go"
+        for replayer in replayers:
+            replayer.start()
+        await loop.run_in_executor(None, conn.recv)  # "stop"
+        for replayer in replayers:
+            replayer.stop()
+        await loop.run_in_executor(None, conn.recv)  # bridge has disconnected
+        standin.close()
+        conn.send((sum(r.sent_chunks for r in replayers), received))
+
+    asyncio.run(serve())
+    for replayer in replayers:
+        replayer.close()
+
+
+async def bridge(paths, port: int, conn, seconds: float):
+    from hardware_serial.ports import PortManager
+    from mqtt.bridge import MQTTBridge
+    from mqtt.publisher import Publisher
+
+    forwarded = 0
+
+    def on_packet(board, dtype, payload, read_at):
+        nonlocal forwarded
+        publisher.submit(dtype, payload, board)
+        forwarded += 1
+
+    manager = PortManager(BAUDRATE, on_packet, [f"b{i}={path}" for i, path in enumerate(paths)], pattern=None)
+    mqtt_bridge = MQTTBridge(manager, spool_dir="")
+    connected = asyncio.Event()
+    on_connect = mqtt_bridge.client.on_connect
+
+    def connect_hook(*a):
+        on_connect(*a)
+        connected.set()
+    mqtt_bridge.client.on_connect = connect_hook
+    mqtt_bridge.connect_asyncio(asyncio.get_running_loop(), "127.0.0.1", port)
+    await asyncio.wait_for(connected.wait(), 5)
+    publisher = Publisher(mqtt_bridge, mode="direct")
+
+    manager.start()
+    while not all(b.ser for b in manager.bridges.values()):
+        await asyncio.sleep(0.1)  # connect() waits for the board to reset
+
+    cpu = time.process_time()
+    conn.send("go")
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - cpu
+    conn.send("stop")
+    await asyncio.sleep(0.3)  # let in-flight packets through
+    await mqtt_bridge.close_async()
+    manager.close()
+    conn.send("done")
+    return forwarded, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--speed", type=float, default=0, help="N times real time, 0 = as fast as possible")
+    parser.add_argument("--boards", type=int, default=1)
+    parser.add_argument("--mix", default="11:2000,12:500,20:100", help="dtype:packets/s at 1x, per board")
+    parser.add_argument("--payload", type=int, default=8)
+    parser.add_argument("--recording", help="replay this recording instead of synthetic traffic")
+    args = parser.parse_args()
+
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=simulator, args=(child, args), daemon=True)
+    process.start()
+    paths, port = parent.recv()
+    forwarded, cpu = asyncio.run(bridge(paths, port, parent, args.seconds))
+    sent, latencies = parent.recv()
+    process.join(5)
+
+    delivered = len(latencies)
+    print(f"{args.boards} board(s): sent {sent} chunks, forwarded {forwarded} packets, "
+          f"{delivered} delivered to MQTT")
+    print(f"throughput: {delivered / args.seconds:.0f} packets/s")
+    print(f"bridge CPU: {1e6 * cpu / max(forwarded, 1):.1f} us per packet "
+          f"({100 * cpu / args.seconds:.0f}% of one core)")
+    if latencies and not args.recording:
+        ms = 1000 * np.array(latencies)
+        print(f"UART->MQTT latency: p50 {np.percentile(ms, 50):.2f} ms  "
+              f"p99 {np.percentile(ms, 99):.2f} ms  max {ms.max():.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Serial recovery time after a USB glitch.
+
+A simulated PCB (a pty replayer behind a symlink, like a /dev/serial/by-id
+link) streams packets to a PortManager. Each glitch closes the pty and
+removes the link, waits --gap seconds, then brings a new one up at the same
+path. Reports how long after the device reappeared the first packet was
+forwarded again, and how long a write made during the outage took to reach
+the board (that includes SERIAL_RESET_DELAY; set it to 0 to leave it out).
+
+    python -m benchmarks.serial_hotplug [--glitches 10] [--gap 0.3] [--no-hotplug]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from hardware_serial.ports import PortManager
+from hardware_serial.recording import Replayer, synthetic_traffic
+
+BAUDRATE = 115200
+HELD_WRITE = bytes.fromhex("01020304")
+
+
+async def wait_for(condition, timeout: float = 10.0, interval: float = 0.0005):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("simulated board never came back")
+        await asyncio.sleep(interval)
+
+
+async def run(args):
+    link = os.path.join(tempfile.mkdtemp(prefix="bring-hotplug-"), "ttyACM-sim")
+    received = []
+
+    def simulate() -> Replayer:
+        replayer = Replayer(synthetic_traffic({0x11: args.rate}), speed=1.0, link=link)
+        os.set_blocking(replayer.master, False)
+        replayer.start()
+        return replayer
+
+    def read_master(replayer: Replayer) -> bytes:
+        try:
+            return os.read(replayer.master, 4096)
+        except BlockingIOError:
+            return b""
+
+    replayer = simulate()
+    manager = PortManager(BAUDRATE, lambda *packet: received.append(time.perf_counter()),
+                          ports=[f"sim={link}"], pattern=None, hotplug=not args.no_hotplug)
+    task = asyncio.get_running_loop().create_task(manager.run())
+    bridge = None
+    reads, writes = [], []
+    try:
+        await wait_for(lambda: received)
+        bridge = manager.bridges["sim"]
+        for _ in range(args.glitches):
+            replayer.close()
+            await wait_for(lambda: bridge.ser is None)
+            manager.write(HELD_WRITE, port="sim")
+            await asyncio.sleep(args.gap)
+
+            del received[:]
+            appeared = time.perf_counter()
+            replayer = simulate()
+            await wait_for(lambda: received)
+            reads.append(received[0] - appeared)
+            written = bytearray()
+            await wait_for(lambda: written.extend(read_master(replayer)) or HELD_WRITE in written)
+            writes.append(time.perf_counter() - appeared)
+    finally:
+        task.cancel()
+        manager.close()
+        replayer.close()
+
+    print(f"{args.glitches} glitches, {args.gap * 1000:.0f} ms outage each, "
+          f"hotplug {'off' if args.no_hotplug else 'on'}")
+    for label, times in (("first packet", reads), ("held write", writes)):
+        ms = 1000 * np.array(times)
+        print(f"  {label:<13} after the device reappeared: "
+              f"p50 {np.median(ms):.1f} ms, max {ms.max():.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--glitches", type=int, default=10)
+    parser.add_argument("--gap", type=float, default=0.3, help="seconds the device is gone")
+    parser.add_argument("--rate", type=float, default=500, help="packets/s from the board")
+    parser.add_argument("--no-hotplug", action="store_true", help="rely on the reconnect backoff alone")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
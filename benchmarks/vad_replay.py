@@ -0,0 +1,138 @@
+"""
+End-of-utterance replay harness.
+
+Replays clips block by block the way the assistant sees them: the noise
+floor is updated continuously, and the endpointer runs from the start of
+recording. Reports how long after the real end of speech each VAD ends
+the turn.
+
+Clips: <dir>/*.wav, each with a <name>.txt holding "record_start speech_end
+[arm_after]" in seconds. Without --clips, synthetic speech is mixed into
+quiet, typical and noisy room noise, plus a recording that starts like the
+assistant's: the tail of the wake word in the pre-roll, the start prompt,
+a pause, then the question.
+
+    python -m benchmarks.vad_replay [--clips DIR] [--vad-model silero_vad.onnx]
+"""
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from audio.vad import Endpointer, EnergyVAD, NoiseFloor, OnnxVAD, ThresholdVAD
+from config import VAD_HANGOVER, VOICE_PREROLL_SECONDS
+
+SAMPLE_RATE = 48000
+BLOCK = 1536
+MAX_SECONDS = 15.0
+LEGACY_HANGOVER = 2.0
+
+# name -> noise RMS (full scale = 1)
+ROOMS = {"quiet": 0.001, "typical": 0.005, "noisy": 0.03}
+
+
+# Assistant-like recording start, in seconds from record_start
+WAKE_TAIL = 0.2
+PROMPT_AT, PROMPT_SECONDS = VOICE_PREROLL_SECONDS, 0.15
+QUESTION_AT = 0.9
+
+
+def _add_speech(audio: np.ndarray, start: float, seconds: float):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((150, 300, 600, 1200, 2400)))
+    syllables = np.abs(np.sin(2 * np.pi * 3 * t)) ** 2
+    first = int(start * SAMPLE_RATE)
+    audio[first:first + len(t)] += 0.15 * voice * syllables
+
+
+def synthetic_clip(noise_rms: float, seed: int = 0):
+    """2 s of room tone, 2.5 s of speech-like audio, 5 s of room tone."""
+    rng = np.random.default_rng(seed)
+    pre, speech, post = 2.0, 2.5, 5.0
+    audio = rng.normal(0, noise_rms, int((pre + speech + post) * SAMPLE_RATE))
+    _add_speech(audio, pre, speech)
+    return audio.astype(np.float32), pre, pre + speech, 0.0
+
+
+def wake_word_clip(noise_rms: float, seed: int = 0):
+    """
+    Recording from the pre-roll on: the wake word's last WAKE_TAIL seconds,
+    the start prompt (a beep) picked up by the mic, a pause, the question.
+    """
+    rng = np.random.default_rng(seed)
+    pre, speech, post = 2.0, 2.5, 5.0
+    audio = rng.normal(0, noise_rms, int((pre + QUESTION_AT + speech + post) * SAMPLE_RATE))
+    _add_speech(audio, pre, WAKE_TAIL)
+    t = np.arange(int(PROMPT_SECONDS * SAMPLE_RATE)) / SAMPLE_RATE
+    first = int((pre + PROMPT_AT) * SAMPLE_RATE)
+    audio[first:first + len(t)] += 0.2 * np.sin(2 * np.pi * 880 * t)
+    _add_speech(audio, pre + QUESTION_AT, speech)
+    return audio.astype(np.float32), pre, pre + QUESTION_AT + speech, PROMPT_AT + PROMPT_SECONDS
+
+
+def load_clips(directory: str):
+    import soundfile as sf
+
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        with open(os.path.splitext(path)[0] + ".txt") as f:
+            record_start, speech_end, *arm_after = map(float, f.read().split())
+        audio, rate = sf.read(path, dtype="float32", always_2d=True)
+        if rate != SAMPLE_RATE:
+            raise ValueError(f"{path}: expected {SAMPLE_RATE} Hz, got {rate}")
+        yield os.path.basename(path), audio[:, 0], record_start, speech_end, (arm_after or [0.0])[0]
+
+
+def replay(make_endpointer, audio: np.ndarray, record_start: float, arm_after: float):
+    """Returns the time (s) at which the turn ended, or None if it never did."""
+    noise = NoiseFloor(SAMPLE_RATE, BLOCK)
+    endpointer = make_endpointer(noise, arm_after)
+    start_block = int(record_start * SAMPLE_RATE) // BLOCK
+    max_blocks = int(MAX_SECONDS * SAMPLE_RATE / BLOCK)
+    for i in range(0, len(audio) // BLOCK):
+        block = audio[i * BLOCK:(i + 1) * BLOCK]
+        noise.update((block * 32767).astype(np.int16))
+        if i < start_block:
+            continue
+        if i - start_block >= max_blocks:
+            return None
+        if endpointer.update(block):
+            return (i + 1) * BLOCK / SAMPLE_RATE
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clips")
+    parser.add_argument("--vad-model", help="Silero VAD ONNX model to include")
+    args = parser.parse_args()
+
+    endpointers = {
+        f"threshold/{LEGACY_HANGOVER:.1f}s": lambda noise, arm_after: Endpointer(
+            ThresholdVAD(), SAMPLE_RATE, hangover=LEGACY_HANGOVER, arm_after=arm_after),
+        f"energy/{VAD_HANGOVER:.1f}s": lambda noise, arm_after: Endpointer(
+            EnergyVAD(noise), SAMPLE_RATE, hangover=VAD_HANGOVER, arm_after=arm_after),
+    }
+    if args.vad_model:
+        endpointers[f"onnx/{VAD_HANGOVER:.1f}s"] = lambda noise, arm_after: Endpointer(
+            OnnxVAD(args.vad_model, SAMPLE_RATE, BLOCK), SAMPLE_RATE, hangover=VAD_HANGOVER,
+            arm_after=arm_after)
+
+    if args.clips:
+        clips = list(load_clips(args.clips))
+    else:
+        clips = [(name, *synthetic_clip(rms)) for name, rms in ROOMS.items()]
+        clips += [(f"{name}+wake", *wake_word_clip(rms)) for name, rms in ROOMS.items()]
+
+    print(f"{'clip':<16}" + "".join(f"{name:>18}" for name in endpointers))
+    for name, audio, record_start, speech_end, arm_after in clips:
+        row = f"{name:<16}"
+        for make in endpointers.values():
+            ended = replay(make, audio, record_start, arm_after)
+            row += f"{'never':>18}" if ended is None else f"{1000 * (ended - speech_end):>15.0f} ms"
+        print(row)
+    print("(time from end of speech to end of turn; negative = cut the speaker off)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Wake-word front-end benchmark: plain decimation vs. the polyphase FIR Decimator.
+
+Runs recorded clips through each resampler and the wake-word models. Reports
+CPU time per second of audio and how many clips triggered. Clips live in
+<clips>/positive/*.wav (should trigger) and <clips>/negative/*.wav (should not).
+They are converted to mono and linearly resampled to 48 kHz if needed. Without
+--clips, only the resampler cost on synthetic audio is measured.
+
+    python -m benchmarks.wake_word [--clips DIR] [--threshold 0.5]
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from audio.dsp import Decimator
+
+HARDWARE_RATE = 48000
+FACTOR = 3
+CHUNK = 1280 * FACTOR
+
+
+class PlainDecimation:
+    """What detect_wake_word used to do: keep every third sample."""
+
+    def reset(self):
+        pass
+
+    def process(self, pcm: np.ndarray) -> np.ndarray:
+        return pcm[::FACTOR]
+
+
+RESAMPLERS = {
+    "decimate": PlainDecimation,
+    "fir": lambda: Decimator(FACTOR, CHUNK, HARDWARE_RATE),
+}
+
+
+def load_clip(path: str) -> np.ndarray:
+    import soundfile as sf
+
+    data, rate = sf.read(path, dtype="int16", always_2d=True)
+    data = data[:, 0]
+    if rate != HARDWARE_RATE:
+        t = np.arange(int(len(data) * HARDWARE_RATE / rate)) / HARDWARE_RATE
+        data = np.interp(t, np.arange(len(data)) / rate, data).astype(np.int16)
+    return data
+
+
+def resampler_cpu(resampler, audio: np.ndarray) -> float:
+    start = time.process_time()
+    for i in range(0, len(audio) - CHUNK + 1, CHUNK):
+        resampler.process(audio[i:i + CHUNK])
+    return time.process_time() - start
+
+
+def run_clip(model, resampler, audio: np.ndarray, threshold: float):
+    """Returns (triggered, cpu seconds)."""
+    model.reset()
+    resampler.reset()
+    triggered = False
+    start = time.process_time()
+    for i in range(0, len(audio) - CHUNK + 1, CHUNK):
+        predictions = model.predict(resampler.process(audio[i:i + CHUNK]))
+        if any(score >= threshold for score in predictions.values()):
+            triggered = True
+    return triggered, time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clips", help="directory with positive/ and negative/ WAV clips")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--models", default=None, help="comma-separated, defaults to config")
+    args = parser.parse_args()
+
+    noise = np.random.default_rng(0).integers(-8000, 8000, HARDWARE_RATE * 30).astype(np.int16)
+    print("resampler cost (CPU ms per second of audio)")
+    for name, factory in RESAMPLERS.items():
+        cpu = resampler_cpu(factory(), noise)
+        print(f"  {name:<9} {1000 * cpu / 30:8.3f}")
+
+    if not args.clips:
+        return
+
+    from audio.wake_word import load_wake_word_model
+    from config import WAKE_WORD_MODELS
+
+    names = args.models.split(",") if args.models else WAKE_WORD_MODELS
+    model = load_wake_word_model(names)
+    clips = {
+        label: [load_clip(p) for p in sorted(glob.glob(os.path.join(args.clips, label, "*.wav")))]
+        for label in ("positive", "negative")
+    }
+    seconds = sum(len(c) for group in clips.values() for c in group) / HARDWARE_RATE
+    print(f"{len(clips['positive'])} positive, {len(clips['negative'])} negative clips, "
+          f"{seconds:.0f}s of audio, threshold {args.threshold}")
+
+    for name, factory in RESAMPLERS.items():
+        resampler = factory()
+        cpu = 0.0
+        hits = {}
+        for label, group in clips.items():
+            hits[label] = 0
+            for audio in group:
+                triggered, clip_cpu = run_clip(model, resampler, audio, args.threshold)
+                hits[label] += triggered
+                cpu += clip_cpu
+        print(f"  {name:<9} detected {hits['positive']}/{len(clips['positive'])}  "
+              f"false triggers {hits['negative']}/{len(clips['negative'])}  "
+              f"CPU {1000 * cpu / max(seconds, 1e-9):.1f} ms per audio second")
+
+
+if __name__ == "__main__":
+    main()
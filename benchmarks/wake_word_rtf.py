@@ -0,0 +1,67 @@
+"""
+Wake-word inference cost by number of models.
+
+For 1..N models, runs synthetic 16 kHz audio through openWakeWord's stock
+sessions and through ours (threads, optimization level) and prints the
+real-time factor: seconds spent per second of audio, as wall time and as
+CPU time. "features" is the shared melspectrogram + embedding front end
+alone, which every model reuses.
+
+    python -m benchmarks.wake_word_rtf [--models hey_jarvis,alexa,...] [--threads 1,2,4]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from audio.wake_word import WAKE_WORD_CHUNK_SAMPLES, WAKE_WORD_SAMPLE_RATE, load_wake_word_model
+from config import WAKE_WORD_OPT_LEVEL
+
+DEFAULT_MODELS = "hey_jarvis,alexa,hey_mycroft,timer,weather"
+
+
+def rtf(run, frames):
+    wall, cpu = time.perf_counter(), time.process_time()
+    for frame in frames:
+        run(frame)
+    seconds = len(frames) * WAKE_WORD_CHUNK_SAMPLES / WAKE_WORD_SAMPLE_RATE
+    return (time.perf_counter() - wall) / seconds, (time.process_time() - cpu) / seconds
+
+
+def measure(model, frames):
+    model.reset()
+    total = rtf(model.predict, frames)
+    model.reset()
+    features = rtf(model.preprocessor, frames)
+    return total, features
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", default=DEFAULT_MODELS,
+                        help="comma-separated bundled names or model paths")
+    parser.add_argument("--threads", default="1,2", help="comma-separated intra-op thread counts")
+    parser.add_argument("--opt-level", default=WAKE_WORD_OPT_LEVEL)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    args = parser.parse_args()
+
+    names = args.models.split(",")
+    rng = np.random.default_rng(0)
+    n_frames = int(args.seconds * WAKE_WORD_SAMPLE_RATE / WAKE_WORD_CHUNK_SAMPLES)
+    frames = [rng.integers(-3000, 3000, WAKE_WORD_CHUNK_SAMPLES).astype(np.int16) for _ in range(n_frames)]
+
+    variants = [("stock", 1, None)] + [
+        (f"{args.opt_level}/{threads}t", int(threads), args.opt_level) for threads in args.threads.split(",")
+    ]
+    print(f"{args.seconds:.0f}s of audio; RTF as wall / cpu")
+    print(f"{'models':>6} {'variant':<12} {'total':>15} {'features':>15} {'per model':>10}")
+    for count in range(1, len(names) + 1):
+        for label, threads, opt_level in variants:
+            model = load_wake_word_model(names[:count], threads=threads, opt_level=opt_level)
+            (wall, cpu), (f_wall, f_cpu) = measure(model, frames)
+            print(f"{count:>6} {label:<12} {wall:>7.3f} / {cpu:.3f} {f_wall:>7.3f} / {f_cpu:.3f} "
+                  f"{(wall - f_wall) / count:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
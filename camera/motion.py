@@ -0,0 +1,54 @@
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+
+THUMB_WIDTH = 80  # pixels; enough to see people moving, cheap to compare
+
+
+class ChangeDetector:
+    """
+    Decides whether a frame differs enough from the last one sent to be worth
+    uploading, by comparing small grayscale thumbnails: the mean absolute
+    difference in gray levels (0-255) must reach `threshold`. A frame is always
+    sent once `keyframe_interval` seconds have passed since the last one.
+    """
+
+    def __init__(self, threshold: float, keyframe_interval: float):
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.last_score = 0.0
+        self._reference: Optional[np.ndarray] = None
+        self._last_sent = 0.0
+
+    def thumbnail(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """None if the frame is a JPEG that doesn't decode (truncated or corrupt)."""
+        if frame.ndim < 3:
+            # Raw JPEG (MJPEG passthrough): let libjpeg decode at 1/8 scale
+            gray = cv2.imdecode(frame.reshape(-1), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+            if gray is None:
+                return None
+        else:
+            step = max(1, frame.shape[1] // (THUMB_WIDTH * 2))
+            # Green channel as luma: no color conversion needed at this size
+            gray = frame[::step, ::step, 1]
+        step = max(1, gray.shape[1] // THUMB_WIDTH)
+        return gray[::step, ::step].astype(np.int16)
+
+    def should_send(self, frame: np.ndarray) -> Optional[bool]:
+        """None for a corrupt frame, which should be dropped."""
+        now = time.monotonic()
+        thumb = self.thumbnail(frame)
+        if thumb is None:
+            return None
+        if self._reference is None or self._reference.shape != thumb.shape \
+                or now - self._last_sent >= self.keyframe_interval:
+            self.last_score = float("inf")
+        else:
+            self.last_score = float(np.abs(thumb - self._reference).mean())
+            if self.last_score < self.threshold:
+                return False
+        self._reference = thumb
+        self._last_sent = now
+        return True
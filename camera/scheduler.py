@@ -0,0 +1,126 @@
+import time
+import logging
+import statistics
+from collections import deque
+from typing import Optional
+
+log = logging.getLogger("camera")
+
+
+class FrameScheduler:
+    """
+    Paces a loop at a fixed rate on the monotonic clock. Deadlines are absolute,
+    so time spent capturing doesn't add to the period; when a deadline is missed
+    by more than a whole period, the missed slots are skipped rather than
+    bursting to catch up.
+    """
+
+    def __init__(self, fps: float, window: int = 50):
+        self.target_fps = fps
+        self.period = 1 / fps
+        self.skipped = 0
+        self._next: Optional[float] = None
+        self._last: Optional[float] = None
+        self._intervals = deque(maxlen=window)
+
+    def wait(self) -> int:
+        """Sleep until the next slot; returns how many slots were skipped."""
+        now = time.monotonic()
+        if self._next is None:
+            self._next = now
+        delay = self._next - now
+        missed = 0
+        if delay > 0:
+            time.sleep(delay)
+            now = time.monotonic()
+        elif -delay >= self.period:
+            missed = int(-delay // self.period)
+            self.skipped += missed
+            self._next += missed * self.period
+        self._next += self.period
+
+        if self._last is not None:
+            self._intervals.append(now - self._last)
+        self._last = now
+        return missed
+
+    def reset(self):
+        self._next = self._last = None
+        self._intervals.clear()
+
+    @property
+    def achieved_fps(self) -> float:
+        if not self._intervals:
+            return 0.0
+        return len(self._intervals) / sum(self._intervals)
+
+    @property
+    def jitter(self) -> float:
+        """Standard deviation of the frame interval, in seconds."""
+        if len(self._intervals) < 2:
+            return 0.0
+        return statistics.pstdev(self._intervals)
+
+
+class QualityController:
+    """
+    Keeps uploads within the per-frame time budget. When the smoothed upload
+    time exceeds the budget, JPEG quality is lowered step by step, then the
+    resolution; once uploads take less than half the budget, it steps back
+    towards the configured quality and full resolution.
+    """
+
+    QUALITY_STEP = 10
+    MIN_QUALITY = 40
+    SCALES = (1.0, 0.75, 0.5)
+
+    def __init__(self, budget: float, quality: int, cooldown: int = 10, alpha: float = 0.2):
+        self.budget = budget
+        self.max_quality = quality
+        self.quality = quality
+        self.scale_index = 0
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.upload_time: Optional[float] = None
+        self._since_change = 0
+
+    @property
+    def scale(self) -> float:
+        return self.SCALES[self.scale_index]
+
+    def record(self, upload_seconds: float):
+        if self.upload_time is None:
+            self.upload_time = upload_seconds
+        else:
+            self.upload_time += self.alpha * (upload_seconds - self.upload_time)
+
+        self._since_change += 1
+        if self._since_change < self.cooldown:
+            return
+        if self.upload_time > self.budget:
+            self._degrade()
+        elif self.upload_time < self.budget / 2:
+            self._restore()
+
+    def _degrade(self):
+        if self.quality > self.MIN_QUALITY:
+            self.quality = max(self.MIN_QUALITY, self.quality - self.QUALITY_STEP)
+        elif self.scale_index < len(self.SCALES) - 1:
+            self.scale_index += 1
+        else:
+            return
+        self._changed("Uploads over budget")
+
+    def _restore(self):
+        if self.scale_index > 0:
+            self.scale_index -= 1
+        elif self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + self.QUALITY_STEP)
+        else:
+            return
+        self._changed("Bandwidth recovered")
+
+    def _changed(self, reason: str):
+        self._since_change = 0
+        log.info("%s (%.0f ms/frame, budget %.0f ms): JPEG quality=%d scale=%.2f",
+                 reason, 1000 * self.upload_time, 1000 * self.budget, self.quality, self.scale)
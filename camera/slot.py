@@ -0,0 +1,40 @@
+import threading
+from typing import Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LatestSlot(Generic[T]):
+    """
+    Single-item hand-off between two pipeline stages. A put replaces any item
+    the consumer has not taken yet, so the consumer always gets the freshest one.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item: Optional[T] = None
+        self._full = False
+
+    def put(self, item: T) -> bool:
+        """Store `item`; returns True if it replaced an unread one."""
+        with self._cond:
+            replaced = self._full
+            self._item = item
+            self._full = True
+            self._cond.notify_all()
+            return replaced
+
+    def get(self, timeout: Optional[float] = None) -> Optional[T]:
+        """Take the item, waiting up to `timeout`; None if nothing arrived."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._full, timeout):
+                return None
+            item, self._item = self._item, None
+            self._full = False
+            self._cond.notify_all()
+            return item
+
+    def wait_empty(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the consumer has taken the current item."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._full, timeout)
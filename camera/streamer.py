@@ -1,32 +1,130 @@
 import threading
 import time
 import logging
+from typing import Optional, Tuple
+
 import cv2
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    CAMERA_URL, CAMERA_INDEX, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS, CAMERA_JPEG_QUALITY,
+    CAMERA_MJPEG, CAMERA_CHANGE_THRESHOLD, CAMERA_KEYFRAME_INTERVAL,
+)
+from camera.motion import ChangeDetector
+from camera.scheduler import FrameScheduler, QualityController
+from camera.slot import LatestSlot
+from runtime import metrics
 
 log = logging.getLogger("camera")
 
-CAMERA_URL = "http://206.167.46.66:3000/camera/frame"  # your Elysia backend
-CAMERA_INDEX = 0
-CAMERA_WIDTH = 640
-CAMERA_HEIGHT = 480
-CAMERA_FPS = 10
 RETRY_DELAY = 2  # seconds before retrying
+UPLOAD_TIMEOUT = 2.0  # seconds; uploads no longer hold up capture
+STAGE_POLL = 0.5  # seconds a stage waits before re-checking `running`
+
+FRAMES = metrics.Counter("bring_camera_frames_total", "Captured frames by outcome", ["result"])
+FRAMES_SENT = FRAMES.labels("sent")
+FRAMES_FAILED = FRAMES.labels("failed")
+FRAMES_STALE = FRAMES.labels("stale")
+FRAMES_SKIPPED = FRAMES.labels("skipped")
+FRAMES_PASSTHROUGH = FRAMES.labels("passthrough")
+FRAMES_UNCHANGED = FRAMES.labels("unchanged")
+FRAMES_CORRUPT = FRAMES.labels("corrupt")
+READ_FAILURES = metrics.Counter("bring_camera_read_failures_total", "Failed camera reads")
+ENCODE_SECONDS = metrics.Histogram("bring_camera_encode_seconds", "JPEG encode time")
+UPLOAD_SECONDS = metrics.Histogram("bring_camera_upload_seconds", "Frame POST round-trip time")
+FRAME_LATENCY = metrics.Histogram("bring_camera_frame_latency_seconds",
+                                  "Time from capture to upload acknowledged")
+TARGET_FPS = metrics.Gauge("bring_camera_target_fps", "Configured capture rate")
+ACHIEVED_FPS = metrics.Gauge("bring_camera_achieved_fps", "Measured capture rate")
+JITTER = metrics.Gauge("bring_camera_jitter_seconds", "Standard deviation of the capture interval")
+JPEG_QUALITY_GAUGE = metrics.Gauge("bring_camera_jpeg_quality", "Current JPEG quality")
+SCALE = metrics.Gauge("bring_camera_scale", "Current resolution scale factor")
+
+# (capture time from time.time(), BGR image or raw JPEG bytes)
+Frame = Tuple[float, np.ndarray]
+
+
+def _is_jpeg(frame: np.ndarray) -> bool:
+    """Undecoded MJPEG buffers come back as a flat uint8 array starting with SOI."""
+    return (frame.ndim == 1 or frame.shape[0] == 1) and frame.size > 2 \
+        and frame.flat[0] == 0xFF and frame.flat[1] == 0xD8
+
+
+class CameraStreamer:
+    """
+    Captures frames and uploads them as JPEG in three stages:
 
-class CameraStreamer(threading.Thread):
-    def __init__(self):
-        super().__init__(daemon=True)
+        capture -> [latest raw frame] -> encode -> [latest JPEG] -> upload
+
+    The encoder only picks up a new frame once the uploader has taken the
+    previous JPEG, so when the backend is slow raw frames are replaced in the
+    first slot and never encoded. Uploads reuse one keep-alive connection.
+
+    Capture runs on a fixed-rate FrameScheduler, and a QualityController
+    trades JPEG quality and resolution against the measured upload time.
+
+    With MJPEG passthrough the camera's own JPEGs are forwarded as-is; they
+    are only decoded and re-encoded while the QualityController has lowered
+    quality or resolution.
+
+    With a change threshold set, frames that look like the last one sent are
+    skipped before encoding, apart from periodic keyframes.
+    """
+
+    def __init__(
+        self,
+        url: str = CAMERA_URL,
+        mjpeg: bool = CAMERA_MJPEG,
+        change_threshold: float = CAMERA_CHANGE_THRESHOLD,
+    ):
+        self.url = url
+        self.mjpeg = mjpeg
+        self.detector: Optional[ChangeDetector] = None
+        if change_threshold > 0:
+            self.detector = ChangeDetector(change_threshold, CAMERA_KEYFRAME_INTERVAL)
         self.running = True
         self.cap = None
 
+        self._frames: LatestSlot[Frame] = LatestSlot()
+        self._jpegs: LatestSlot[Frame] = LatestSlot()
+        self._encoder = threading.Thread(target=self._encode_loop, daemon=True)
+        self._uploader = threading.Thread(target=self._upload_loop, daemon=True)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "image/jpeg"
+
+        self.scheduler = FrameScheduler(CAMERA_FPS)
+        self.quality = QualityController(budget=self.scheduler.period, quality=CAMERA_JPEG_QUALITY)
+        TARGET_FPS.set(CAMERA_FPS)
+        ACHIEVED_FPS.set_function(lambda: self.scheduler.achieved_fps)
+        JITTER.set_function(lambda: self.scheduler.jitter)
+        JPEG_QUALITY_GAUGE.set_function(lambda: self.quality.quality)
+        SCALE.set_function(lambda: self.quality.scale)
+
+    def _open_capture(self):
+        cap = cv2.VideoCapture(CAMERA_INDEX, cv2.CAP_V4L2)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+        cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+        if self.mjpeg:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+            cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        return cap
+
     def run(self):
+        self._encoder.start()
+        self._uploader.start()
+
+        check_mjpeg = False
         while self.running:
             # Try to open camera
             if self.cap is None or not self.cap.isOpened():
-                self.cap = cv2.VideoCapture(CAMERA_INDEX, cv2.CAP_V4L2)
-                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
-                self.cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+                self.cap = self._open_capture()
                 if not self.cap.isOpened():
                     log.warning("Camera failed to open, retrying in 2s...")
                     self.cap.release()
@@ -34,32 +132,124 @@ class CameraStreamer(threading.Thread):
                     time.sleep(RETRY_DELAY)
                     continue
                 log.info("Camera started successfully")
+                self.scheduler.reset()
+                check_mjpeg = self.mjpeg
+
+            skipped = self.scheduler.wait()
+            if skipped:
+                FRAMES_SKIPPED.inc(skipped)
 
             ret, frame = self.cap.read()
             if not ret:
                 log.warning("Failed to read frame, reconnecting...")
+                READ_FAILURES.inc()
                 self.cap.release()
                 self.cap = None
                 time.sleep(RETRY_DELAY)
                 continue
 
-            # Encode frame as JPEG
-            _, jpeg = cv2.imencode(".jpg", frame)
+            if check_mjpeg:
+                check_mjpeg = False
+                if _is_jpeg(frame):
+                    log.info("Forwarding camera MJPEG without re-encoding")
+                else:
+                    log.warning("Camera did not deliver MJPEG, falling back to re-encoding")
+                    self.mjpeg = False
+                    self.cap.release()
+                    self.cap = None
+                    continue
+
+            if self._frames.put((time.time(), frame)):
+                FRAMES_STALE.inc()
+
+    def _encode_loop(self):
+        while self.running:
+            # Nothing restarts this thread: one bad frame must not end it
+            try:
+                self._encode_next()
+            except Exception:
+                log.exception("Encoding a frame failed, dropping it")
+
+    def _encode_next(self):
+        # Hold off until the uploader took the last JPEG, so frames that
+        # pile up meanwhile are replaced before we spend time encoding them
+        if not self._jpegs.wait_empty(STAGE_POLL):
+            return
+        item = self._frames.get(STAGE_POLL)
+        if item is None:
+            return
+        captured_at, frame = item
+
+        if self.detector:
+            send = self.detector.should_send(frame)
+            if send is None:
+                FRAMES_CORRUPT.inc()
+                return
+            if not send:
+                FRAMES_UNCHANGED.inc()
+                return
 
-            # POST frame to backend
+        quality, scale = self.quality.quality, self.quality.scale
+        if _is_jpeg(frame):
+            if quality >= self.quality.max_quality and scale == 1.0:
+                FRAMES_PASSTHROUGH.inc()
+                self._jpegs.put((captured_at, frame))
+                return
+            # Uploads are over budget: shrink this one the slow way
+            frame = cv2.imdecode(frame.reshape(-1), cv2.IMREAD_COLOR)
+            if frame is None:
+                FRAMES_CORRUPT.inc()
+                return
+
+        start = time.perf_counter()
+        if scale < 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        ENCODE_SECONDS.observe(time.perf_counter() - start)
+        if ok:
+            self._jpegs.put((captured_at, jpeg))
+
+    def _upload_loop(self):
+        while self.running:
+            item = self._jpegs.get(STAGE_POLL)
+            if item is None:
+                continue
+            captured_at, jpeg = item
             try:
-                requests.post(
-                    CAMERA_URL,
-                    data=jpeg.tobytes(),
-                    headers={"Content-Type": "image/jpeg"},
-                    timeout=0.2,
-                )
-            except Exception as e:
-                log.warning("Failed to send frame: %s", e)
+                self._upload(captured_at, jpeg)
+            except Exception:
+                log.exception("Uploading a frame failed, dropping it")
 
-            time.sleep(1 / CAMERA_FPS)
+    def _upload(self, captured_at: float, jpeg: np.ndarray) -> bool:
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                self.url,
+                data=jpeg.tobytes(),
+                headers={"X-Frame-Timestamp": f"{captured_at:.6f}"},
+                timeout=UPLOAD_TIMEOUT,
+            )
+            response.close()
+        except Exception as e:
+            log.warning("Failed to send frame: %s", e)
+            FRAMES_FAILED.inc()
+            # A timeout is the most over-budget upload there is; count any
+            # failure as one so quality and resolution still come down
+            self.quality.record(max(time.perf_counter() - start, UPLOAD_TIMEOUT))
+            return False
+        elapsed = time.perf_counter() - start
+        UPLOAD_SECONDS.observe(elapsed)
+        self.quality.record(elapsed)
+        FRAME_LATENCY.observe(time.time() - captured_at)
+        if not response.ok:
+            log.warning("Frame rejected by backend: HTTP %d", response.status_code)
+            FRAMES_FAILED.inc()
+            return False
+        FRAMES_SENT.inc()
+        return True
 
     def stop(self):
         self.running = False
         if self.cap and self.cap.isOpened():
             self.cap.release()
+        self.session.close()
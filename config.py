@@ -4,13 +4,69 @@ load_dotenv()
 
 # Serial
 BAUDRATE = int(os.getenv("BAUDRATE", 9600))
+# Every port matching this is opened, one board each (e.g. /tmp/ttyACM-sim for
+# python -m hardware_serial.recording)
+SERIAL_PORT_GLOB = os.getenv("SERIAL_PORT_GLOB", "/dev/ttyACM*")
+# Extra ports, comma-separated, optionally named: "kitchen=/dev/serial/by-id/usb-...".
+# Unnamed ports are named after the device (ttyACM0); the name is used in MQTT topics.
+SERIAL_PORTS = [p.strip() for p in os.getenv("SERIAL_PORTS", "").split(",") if p.strip()]
+# Board that gets the voice assistant's LED commands (empty: all of them)
+SERIAL_LED_PORT = os.getenv("SERIAL_LED_PORT", "")
+# Append every raw chunk read from the PCB to this recording (empty disables)
+SERIAL_RECORD = os.getenv("SERIAL_RECORD", "")
+# Seconds a board needs after its port is opened (opening resets it) before it
+# takes writes; reads start right away. 0 for boards that don't reset.
+SERIAL_RESET_DELAY = float(os.getenv("SERIAL_RESET_DELAY", 1.0))
+# Watch /dev for boards appearing (inotify) instead of polling for them
+SERIAL_HOTPLUG = os.getenv("SERIAL_HOTPLUG", "1") == "1"
+# Largest valid total_size (header included); anything else triggers a resync
+SERIAL_MAX_PACKET_SIZE = int(os.getenv("SERIAL_MAX_PACKET_SIZE", 255))
+# Bytes allowed to wait for the UART (or for an unplugged board to come back)
+# before device/write commands are dropped
+SERIAL_WRITE_QUEUE_BYTES = int(os.getenv("SERIAL_WRITE_QUEUE_BYTES", 4096))
 
 # MQTT
 MQTT_BROKER = os.getenv("MQTT_BROKER", "206.167.46.66")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 MQTT_USERNAME = os.getenv("MQTT_USERNAME", "dev")
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD", "lrimalrima")
+# Commands for every board; device/{port}/write targets one of them
 MQTT_SUB_TOPIC = os.getenv("MQTT_SUB_TOPIC", "device/write")
+# Publish readings on device/{port}/{dtype} ("0": device/{dtype}, as with a single board)
+MQTT_PORT_TOPICS = os.getenv("MQTT_PORT_TOPICS", "1") == "1"
+# "direct" publishes every reading, "latest" only the last value per topic in each
+# window, "batch" packs up to MQTT_BATCH_SIZE readings into one device/{dtype}/batch message
+MQTT_PUBLISH_MODE = os.getenv("MQTT_PUBLISH_MODE", "direct")
+MQTT_PUBLISH_WINDOW = float(os.getenv("MQTT_PUBLISH_WINDOW", 0.1))  # seconds
+MQTT_BATCH_SIZE = int(os.getenv("MQTT_BATCH_SIZE", 10))
+# Comma-separated topic prefixes carrying raw bytes instead of hex strings, in both
+# directions (e.g. "device/0A,device/write"), matched without the port segment.
+# Everything else stays hex.
+MQTT_RAW_PREFIXES = tuple(
+    p.strip() for p in os.getenv("MQTT_RAW_PREFIXES", "").split(",") if p.strip()
+)
+# Typed decoding per dtype: "dtype=struct format[:field,...]" separated by ";",
+# e.g. "11=<hH:temperature,humidity;12=<3h:x,y,z". Payloads are in the PCB's
+# byte order (already un-reversed).
+MQTT_DECODERS = {
+    int(dtype, 16): spec.strip()
+    for dtype, spec in (item.split("=", 1) for item in os.getenv("MQTT_DECODERS", "").split(";") if item.strip())
+}
+# "alongside" also publishes decoded readings on device/{port}/{dtype}/decoded,
+# "instead" replaces the hex on device/{port}/{dtype}, "off" ignores MQTT_DECODERS
+MQTT_DECODED = os.getenv("MQTT_DECODED", "alongside")
+MQTT_DECODED_FORMAT = os.getenv("MQTT_DECODED_FORMAT", "json")  # json or cbor
+# Readings published while the broker is unreachable are kept in this directory
+# ("" disables) and resent with QoS 1 once it's back. The oldest are dropped
+# past MQTT_SPOOL_MAX_BYTES.
+MQTT_SPOOL_DIR = os.getenv("MQTT_SPOOL_DIR", "spool")
+MQTT_SPOOL_MAX_BYTES = int(os.getenv("MQTT_SPOOL_MAX_BYTES", 64 * 1024 * 1024))
+MQTT_SPOOL_SEGMENT_BYTES = int(os.getenv("MQTT_SPOOL_SEGMENT_BYTES", 4 * 1024 * 1024))
+# Resent messages per second (0: unlimited), and how many may await a PUBACK
+MQTT_SPOOL_DRAIN_RATE = float(os.getenv("MQTT_SPOOL_DRAIN_RATE", 500))
+MQTT_SPOOL_INFLIGHT = int(os.getenv("MQTT_SPOOL_INFLIGHT", 20))
+# Seconds between msyncs of new spool records and the acknowledged cursor
+MQTT_SPOOL_SYNC_INTERVAL = float(os.getenv("MQTT_SPOOL_SYNC_INTERVAL", 1.0))
 
 # Camera
 CAMERA_URL = os.getenv("CAMERA_URL", "http://206.167.46.66:3000/camera/frame")
@@ -18,6 +74,15 @@ CAMERA_INDEX = int(os.getenv("CAMERA_INDEX", 0))
 CAMERA_WIDTH = int(os.getenv("CAMERA_WIDTH", 640))
 CAMERA_HEIGHT = int(os.getenv("CAMERA_HEIGHT", 480))
 CAMERA_FPS = int(os.getenv("CAMERA_FPS", 10))
+# Upper bound; lowered automatically while uploads fall behind
+CAMERA_JPEG_QUALITY = int(os.getenv("CAMERA_JPEG_QUALITY", 95))
+# Ask V4L2 for MJPEG and forward the camera's own JPEGs without re-encoding.
+# Falls back to decode + cv2.imencode if the camera can't deliver MJPEG.
+CAMERA_MJPEG = os.getenv("CAMERA_MJPEG", "1").lower() in ("1", "true", "yes")
+# Skip frames whose mean gray-level difference from the last sent frame is below
+# this (0-255, 0 disables), but always send one every CAMERA_KEYFRAME_INTERVAL seconds
+CAMERA_CHANGE_THRESHOLD = float(os.getenv("CAMERA_CHANGE_THRESHOLD", 0))
+CAMERA_KEYFRAME_INTERVAL = float(os.getenv("CAMERA_KEYFRAME_INTERVAL", 5))
 
 # Metrics
 METRICS_PORT = int(os.getenv("METRICS_PORT", 8000))
@@ -31,4 +96,39 @@ WAKE_WORD_MODELS = [
     if m.strip()
 ]
 WAKE_WORD_THRESHOLD = float(os.getenv("WAKE_WORD_THRESHOLD", 0.5))
+# Local cache for bundled models; filled once by `python -m audio.wake_word`
+# (or the first start) and only read from afterwards
+WAKE_WORD_MODEL_DIR = os.getenv("WAKE_WORD_MODEL_DIR", "models")
+# Per-model overrides of WAKE_WORD_THRESHOLD, keyed like WAKE_WORD_MODELS
+# (e.g. "hey_jarvis=0.6,ok_bring.onnx=0.4")
+WAKE_WORD_THRESHOLDS = {
+    name.strip(): float(value)
+    for name, value in (item.split("=") for item in os.getenv("WAKE_WORD_THRESHOLDS", "").split(",") if item.strip())
+}
+# ONNX Runtime threads per wake-word session and graph optimization level
+# (disable, basic, extended, all). Optimized graphs are cached in WAKE_WORD_MODEL_DIR.
+WAKE_WORD_THREADS = int(os.getenv("WAKE_WORD_THREADS", 1))
+WAKE_WORD_OPT_LEVEL = os.getenv("WAKE_WORD_OPT_LEVEL", "all")
+
+# Voice assistant
+# Seconds of audio before the wake-word detection point kept at the start of a recording
+VOICE_PREROLL_SECONDS = float(os.getenv("VOICE_PREROLL_SECONDS", 0.25))
+# Output device rate; UI sounds and waiting music are decoded and resampled to it once
+AUDIO_OUTPUT_RATE = int(os.getenv("AUDIO_OUTPUT_RATE", 48000))
+# End-of-utterance detection: "energy" (adaptive noise floor), "onnx" (Silero VAD
+# model at VAD_MODEL, falls back to energy) or "threshold" (old fixed RMS level)
+VAD_BACKEND = os.getenv("VAD_BACKEND", "energy")
+VAD_MODEL = os.getenv("VAD_MODEL", "silero_vad.onnx")
+# Seconds of non-speech after which the user is considered done
+VAD_HANGOVER = float(os.getenv("VAD_HANGOVER", 0.4))
+
+# AI backend
+AI_CHAT_URL = os.getenv("AI_CHAT_URL", "http://206.167.46.66:3000/ia/chat/audio")
+AI_STREAM_URL = os.getenv("AI_STREAM_URL", AI_CHAT_URL + "/stream")
+# "json" posts the whole recording base64-encoded once the user stops talking;
+# "stream" sends it to AI_STREAM_URL as a chunked upload while they are talking
+AI_UPLOAD_MODE = os.getenv("AI_UPLOAD_MODE", "json")
+# wav, flac or opus ("stream" mode: wav or opus)
+AI_AUDIO_CODEC = os.getenv("AI_AUDIO_CODEC", "wav")
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", 60))
 
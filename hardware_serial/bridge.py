@@ -1,79 +1,161 @@
 import glob
+import threading
 import time
 import logging
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 
 import serial
 
+from config import SERIAL_MAX_PACKET_SIZE, SERIAL_PORT_GLOB, SERIAL_RECORD, SERIAL_RESET_DELAY
+from hardware_serial.framing import FrameDecoder
+from hardware_serial.recording import Recorder
+from hardware_serial.writer import PRIORITY_DEVICE, PRIORITY_LED, SerialWriter
+from runtime import metrics
+
 log = logging.getLogger("serial")
 
+CONNECTS = metrics.Counter("bring_serial_connects_total", "Successful serial port connections")
+DISCONNECTS = metrics.Counter("bring_serial_disconnects_total", "Serial ports dropped after an error")
+READ_ERRORS = metrics.Counter("bring_serial_read_errors_total", "Failed reads from the serial port")
+WRITE_ERRORS = metrics.Counter("bring_serial_write_errors_total", "Failed writes to the serial port")
+BYTES_READ = metrics.Counter("bring_serial_read_bytes_total", "Bytes read from the serial port")
+CONNECTED = metrics.Gauge("bring_serial_connected", "Open serial ports")
+
 class SerialBridge:
-    def __init__(self, baudrate: int):
+    def __init__(self, baudrate: int, path: Optional[str] = None, record: str = SERIAL_RECORD,
+                 name: str = "default"):
         self.baudrate = baudrate
+        # Labels this board's metrics; PortManager passes the port's name
+        self.name = name
+        # A fixed device, or None to take the first port matching SERIAL_PORT_GLOB
+        self.path = path
         self.ser: Optional[serial.Serial] = None
         self.port: Optional[str] = None
+        # Payloads arrive reversed on the wire; the decoder flips them back
+        self.decoder = FrameDecoder(max_size=SERIAL_MAX_PACKET_SIZE, reverse=True)
+        # The reader thread and the voice assistant may both try to (re)connect
+        self._connect_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.writer: Optional[SerialWriter] = None
+        # monotonic time the board is back from the reset opening the port causes
+        self.writable_at = 0.0
+        # Called (from whichever thread did it) when a port is opened or dropped
+        self.on_connect: Optional[Callable[[], None]] = None
+        self.on_disconnect: Optional[Callable[[], None]] = None
+        self.recorder: Optional[Recorder] = Recorder(record, baudrate) if record else None
+
+    def start_writer(self):
+        """Route writes through a background SerialWriter from now on."""
+        if self.writer is None:
+            self.writer = SerialWriter(self._write_now, self.name)
+            if self.ser:
+                self.writer.resume(self.writable_at)
+            else:
+                self.writer.pause()
+            self.writer.start()
 
     def connect(self):
+        with self._connect_lock:
+            self._connect()
+
+    def _connect(self):
         if self.ser and self.ser.is_open:
             return
 
-        for port in sorted(glob.glob("/dev/ttyACM*")):
+        for port in [self.path] if self.path else sorted(glob.glob(SERIAL_PORT_GLOB)):
             log.info(f"Found serial {port}")
             try:
                 self.ser = serial.Serial(port, self.baudrate, timeout=1)
                 self.port = port
-                time.sleep(1)
+                self.decoder.reset()
+                # Opening the port resets the board. Reading starts now (the
+                # decoder resyncs past its boot output); writes wait for it.
+                self.writable_at = time.monotonic() + SERIAL_RESET_DELAY
+                if self.writer:
+                    self.writer.resume(self.writable_at)
+                CONNECTS.inc()
+                CONNECTED.inc()
                 log.info("Connected serial port=%s baud=%d", port, self.baudrate)
+                if self.on_connect:
+                    self.on_connect()
                 return
             except Exception as e:
                 log.error(f"An error occured when trying to connect to serial port: {e}")
                 continue
 
-        log.warning("No serial device found")
+        log.warning("No serial device found%s", f" at {self.path}" if self.path else "")
+
+    def write(self, data: bytes, priority: int = PRIORITY_DEVICE):
+        if self.writer:
+            self.writer.submit(data, priority)
+        else:
+            self._write_now(data)
+
+    def _write_now(self, data: bytes):
+        with self._write_lock:
+            if not self.ser or not self.ser.is_open:
+                return
+            delay = self.writable_at - time.monotonic()
+            if delay > 0:
+                # Only without a writer, which waits for the board itself
+                time.sleep(delay)
+            try:
+                self.ser.write(data)
+            except Exception as e:
+                log.error("Serial write failed: %s", e)
+                WRITE_ERRORS.inc()
+                self._drop()
 
     def write_hex(self, hex_data: str):
-        if not self.ser:
-            return
-        try:
-            self.ser.write(bytes.fromhex(hex_data))
-        except Exception as e:
-            log.error("Serial write failed: %s", e)
-            self._drop()
+        self.write(bytes.fromhex(hex_data))
+
     def write_rgb(self, r: int, g: int, b: int):
         """
         Send RGB LED command.
         Protocol: [0x0A, R, G, B]
         """
-        if not self.ser or not self.ser.is_open:
-            return
-        try:
-            self.ser.write(bytes([0x0A, r & 0xFF, g & 0xFF, b & 0xFF]))
-        except Exception as e:
-            log.error("RGB write failed: %s", e)
-            self._drop()
-    def read_packet(self):
-        if not self.ser or self.ser.in_waiting < 2:
-            return None
+        self.write(bytes([0x0A, r & 0xFF, g & 0xFF, b & 0xFF]), PRIORITY_LED)
+
+    def read_packets(self) -> List[Tuple[int, bytes]]:
+        """
+        Take everything already buffered by the driver in one read (blocking up
+        to the port timeout if there is nothing) and return the complete packets.
+        """
+        if not self.ser:
+            return []
         try:
-            header = self.ser.read(2)
-            dtype, total_size = header
-            payload_len = total_size - 2
-            if payload_len < 0:
-                return None
-            payload = self.ser.read(payload_len)
-            return dtype, payload
+            data = self.ser.read(self.ser.in_waiting or 1)
         except Exception as e:
             log.error("Serial read failed: %s", e)
+            READ_ERRORS.inc()
             self._drop()
-            return None
+            return []
+        BYTES_READ.inc(len(data))
+        if self.recorder:
+            self.recorder.write(data)
+        return self.decoder.feed(data)
 
     def _drop(self):
+        was_open = self.ser is not None
+        if self.writer:
+            # Writes queue up until the board is back
+            self.writer.pause()
         try:
             if self.ser:
+                DISCONNECTS.inc()
                 self.ser.close()
         finally:
+            if was_open:
+                CONNECTED.dec()
             self.ser = None
             self.port = None
+        if was_open and self.on_disconnect:
+            self.on_disconnect()
 
     def close(self):
+        if self.writer:
+            self.writer.stop()
+            self.writer = None
         self._drop()
+        if self.recorder:
+            self.recorder.close()
@@ -0,0 +1,90 @@
+import logging
+from typing import List, Tuple
+
+from runtime import metrics
+
+log = logging.getLogger("serial")
+
+RESYNCS = metrics.Counter("bring_serial_resyncs_total", "Bytes skipped to recover packet framing")
+
+HEADER_SIZE = 2  # [dtype, total_size]; total_size includes the header itself
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for the UART packet protocol: [dtype, total_size, payload...]
+
+    Bytes are appended to one reusable buffer and every complete packet is
+    emitted as soon as it is available. With reverse=True payloads come out
+    byte-reversed (the PCB sends them last byte first) in the same single copy
+    that extracts them from the buffer. A header whose size is impossible
+    (shorter than the header, or above max_size) means we are out of sync:
+    the first byte is discarded and decoding resumes from the next one.
+    """
+
+    def __init__(self, max_size: int = 255, capacity: int = 4096, reverse: bool = False):
+        self.max_size = max_size
+        self.reverse = reverse
+        self._buf = bytearray(max(capacity, 2 * max_size))
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self.resyncs = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def reset(self):
+        self._start = self._end = 0
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        """Append raw bytes and return every packet completed by them."""
+        n = len(data)
+        if self._end + n > len(self._buf):
+            self._make_room(n)
+        self._view[self._end:self._end + n] = data
+        self._end += n
+        return self._decode()
+
+    def _make_room(self, n: int):
+        # Only a partial packet (< max_size) is ever left over, so sliding it
+        # to the front is cheap; grow only for oversized chunks.
+        pending = self._end - self._start
+        if pending + n > len(self._buf):
+            self._view.release()
+            self._buf.extend(bytes(pending + n - len(self._buf)))
+            self._view = memoryview(self._buf)
+        self._view[:pending] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    def _decode(self) -> List[Tuple[int, bytes]]:
+        packets = []
+        buf, view = self._buf, self._view
+        start, end = self._start, self._end
+        max_size = self.max_size
+        reverse = self.reverse
+
+        while end - start >= HEADER_SIZE:
+            total_size = buf[start + 1]
+            if total_size < HEADER_SIZE or total_size > max_size:
+                start += 1
+                self.resyncs += 1
+                RESYNCS.inc()
+                if self.resyncs % 100 == 1:
+                    log.warning("Bad packet length %d, resynchronizing (%d so far)",
+                                total_size, self.resyncs)
+                continue
+            if end - start < total_size:
+                break
+            if reverse:
+                payload = bytes(view[start + total_size - 1:start + HEADER_SIZE - 1:-1])
+            else:
+                payload = bytes(view[start + HEADER_SIZE:start + total_size])
+            packets.append((buf[start], payload))
+            start += total_size
+
+        if start == end:
+            start = end = 0
+        self._start, self._end = start, end
+        return packets
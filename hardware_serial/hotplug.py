@@ -0,0 +1,130 @@
+import asyncio
+import ctypes
+import os
+import struct
+import logging
+from typing import Callable, Dict, Iterable, Optional, Set
+
+log = logging.getLogger("serial")
+
+# <sys/inotify.h>
+IN_ATTRIB = 0x0004
+IN_MOVED_TO = 0x0080
+IN_CREATE = 0x0100
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# udev creates the node, then sets its group and mode (IN_ATTRIB); by-id
+# links are renamed into place (IN_MOVED_TO)
+WATCH_MASK = IN_CREATE | IN_ATTRIB | IN_MOVED_TO
+
+EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then len bytes of name
+
+
+class DeviceWatcher:
+    """
+    Calls `on_device(path)` from the event loop whenever an entry is created
+    (or has its permissions changed) in one of `directories`, using inotify
+    on the loop instead of polling. A directory that doesn't exist yet, like
+    /dev/serial/by-id before the first board is plugged in, is picked up when
+    it appears.
+    """
+
+    def __init__(self, directories: Iterable[str], on_device: Callable[[str], None]):
+        self.directories = {os.path.abspath(d) for d in directories}
+        self.on_device = on_device
+        self.fd = -1
+        self._libc = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watches: Dict[int, str] = {}
+        self._missing: Set[str] = set()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> bool:
+        """False if inotify isn't available here (not Linux, out of watches)."""
+        try:
+            self._libc = ctypes.CDLL(None, use_errno=True)
+            self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            log.warning("No inotify, polling for serial devices: %s", e)
+            return False
+        if self.fd < 0:
+            log.warning("inotify_init1 failed, polling for serial devices: %s",
+                        os.strerror(ctypes.get_errno()))
+            return False
+        self._watch_directories(report=False)
+        self._loop = loop
+        loop.add_reader(self.fd, self._on_readable)
+        log.info("Watching %s for serial devices", ", ".join(sorted(self.directories)))
+        return True
+
+    def _add_watch(self, path: str) -> bool:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            return False
+        self._watches[wd] = path
+        return True
+
+    def _watch_directories(self, report: bool = True):
+        """
+        Watch every directory that exists; for the others watch their closest
+        existing parent, to hear about them being created.
+        """
+        watched = set(self._watches.values())
+        for directory in sorted(self.directories - watched):
+            if os.path.isdir(directory) and self._add_watch(directory):
+                if report and directory in self._missing:
+                    # Its entries may have been created before the watch was
+                    for name in sorted(os.listdir(directory)):
+                        self.on_device(os.path.join(directory, name))
+                self._missing.discard(directory)
+                continue
+            self._missing.add(directory)
+            parent = os.path.dirname(directory)
+            while parent != os.path.dirname(parent) and not os.path.isdir(parent):
+                parent = os.path.dirname(parent)
+            if parent not in watched:
+                watched.add(parent)
+                self._add_watch(parent)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        rewatch = False
+        offset = 0
+        while offset + EVENT.size <= len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            name = data[offset + EVENT.size:offset + EVENT.size + length].split(b"\0", 1)[0]
+            offset += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                log.warning("inotify queue overflowed, rescanning serial devices")
+                self._missing |= self.directories
+                self._watches.clear()
+                rewatch = True
+                continue
+            if mask & IN_IGNORED:
+                # The directory went away (last board unplugged from by-id)
+                self._watches.pop(wd, None)
+                rewatch = True
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_ISDIR:
+                rewatch = True
+            elif directory in self.directories:
+                self.on_device(os.path.join(directory, os.fsdecode(name)))
+        if rewatch:
+            self._watch_directories()
+
+    def close(self):
+        if self.fd < 0:
+            return
+        if self._loop is not None:
+            self._loop.remove_reader(self.fd)
+        os.close(self.fd)
+        self.fd = -1
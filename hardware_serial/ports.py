@@ -0,0 +1,144 @@
+import asyncio
+import fnmatch
+import functools
+import glob
+import os
+import logging
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from config import SERIAL_HOTPLUG, SERIAL_LED_PORT, SERIAL_PORT_GLOB, SERIAL_PORTS, SERIAL_RECORD
+from hardware_serial.bridge import SerialBridge
+from hardware_serial.hotplug import DeviceWatcher
+from hardware_serial.reader import SerialReader
+from hardware_serial.writer import PRIORITY_DEVICE, PRIORITY_LED
+
+log = logging.getLogger("serial")
+
+SCAN_INTERVAL = 5  # seconds between looks for newly plugged boards, without hotplug
+
+
+def parse_ports(entries: Iterable[str]) -> Dict[str, str]:
+    """["kitchen=/dev/serial/by-id/...", "/dev/ttyUSB0"] -> {name: path}"""
+    ports = {}
+    for entry in entries:
+        name, _, path = entry.rpartition("=")
+        ports[name or os.path.basename(path)] = path
+    return ports
+
+
+class PortManager:
+    """
+    One SerialBridge, writer and event-loop reader per board: every port
+    matching `pattern` plus the configured `ports`. Packets reach
+    `on_packet(port, dtype, payload, read_at)` tagged with the port's name;
+    writes go to one named port or to all of them. Drop-in for a single
+    SerialBridge as far as MQTTBridge and the voice assistant are concerned.
+
+    With `hotplug`, the ports' directories are watched: a new board is
+    served, and a returning one reopened, as soon as its device node shows up.
+    """
+
+    def __init__(self, baudrate: int, on_packet: Callable[[str, int, bytes, float], None],
+                 ports: Iterable[str] = SERIAL_PORTS, pattern: Optional[str] = SERIAL_PORT_GLOB,
+                 led_port: str = SERIAL_LED_PORT, hotplug: bool = SERIAL_HOTPLUG):
+        self.baudrate = baudrate
+        self.on_packet = on_packet
+        self.configured = parse_ports(ports)
+        self.pattern = pattern
+        self.led_port = led_port
+        self.hotplug = hotplug
+        self.bridges: Dict[str, SerialBridge] = {}
+        self._readers: Dict[str, SerialReader] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def scan(self) -> Dict[str, str]:
+        """Configured ports first; globbed ones that are the same device are skipped."""
+        ports = dict(self.configured)
+        seen = {os.path.realpath(path) for path in ports.values()}
+        for path in sorted(glob.glob(self.pattern)) if self.pattern else []:
+            if os.path.realpath(path) not in seen:
+                ports.setdefault(os.path.basename(path), path)
+        return ports
+
+    def _record_path(self, name: str) -> str:
+        if not SERIAL_RECORD:
+            return ""
+        root, ext = os.path.splitext(SERIAL_RECORD)
+        return f"{root}-{name}{ext}"
+
+    def add(self, name: str, path: str):
+        bridge = SerialBridge(self.baudrate, path, record=self._record_path(name), name=name)
+        bridge.start_writer()
+        reader = SerialReader(bridge, functools.partial(self.on_packet, name))
+        self.bridges[name] = bridge
+        self._readers[name] = reader
+        task = asyncio.get_running_loop().create_task(reader.run(), name=f"serial:{name}")
+        task.add_done_callback(self._reader_done)
+        self._tasks[name] = task
+        log.info("Serving board %s on %s", name, path)
+
+    def _reader_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            log.error("Reader %s failed: %r", task.get_name(), task.exception())
+
+    def start(self):
+        """Open readers for the boards present now; call from the event loop."""
+        for name, path in self.scan().items():
+            if name not in self.bridges:
+                self.add(name, path)
+
+    def _watch_directories(self) -> Set[str]:
+        paths = list(self.configured.values())
+        if self.pattern and not glob.has_magic(os.path.dirname(self.pattern)):
+            paths.append(self.pattern)
+        return {os.path.dirname(os.path.abspath(path)) for path in paths}
+
+    def _on_device(self, path: str):
+        if self.pattern and fnmatch.fnmatch(path, self.pattern) or path in self.configured.values():
+            self.start()
+            for name, bridge in self.bridges.items():
+                if bridge.ser is None and os.path.abspath(bridge.path) == path:
+                    self._readers[name].wake()
+
+    async def run(self):
+        # A reader keeps retrying its own port if the board goes away; this
+        # finds new boards and tells readers when theirs is back
+        self.start()
+        watcher = DeviceWatcher(self._watch_directories(), self._on_device)
+        try:
+            if self.hotplug and watcher.start(asyncio.get_running_loop()):
+                await asyncio.Event().wait()
+            while True:
+                await asyncio.sleep(SCAN_INTERVAL)
+                self.start()
+        finally:
+            watcher.close()
+
+    def connect(self):
+        for bridge in list(self.bridges.values()):
+            bridge.connect()
+
+    def _targets(self, port: Optional[str]):
+        if port is None:
+            return list(self.bridges.values())
+        bridge = self.bridges.get(port)
+        if bridge is None:
+            log.warning("No board named %s", port)
+            return []
+        return [bridge]
+
+    def write(self, data: bytes, priority: int = PRIORITY_DEVICE, port: Optional[str] = None):
+        for bridge in self._targets(port):
+            bridge.write(data, priority)
+
+    def write_hex(self, hex_data: str, port: Optional[str] = None):
+        self.write(bytes.fromhex(hex_data), port=port)
+
+    def write_rgb(self, r: int, g: int, b: int):
+        self.write(bytes([0x0A, r & 0xFF, g & 0xFF, b & 0xFF]), PRIORITY_LED, self.led_port or None)
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        for bridge in self.bridges.values():
+            bridge.close()
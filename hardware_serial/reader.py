@@ -0,0 +1,88 @@
+import asyncio
+import random
+import time
+import logging
+from typing import Callable, List, Optional
+
+from hardware_serial.bridge import SerialBridge
+from runtime import metrics
+
+log = logging.getLogger("serial")
+
+# Seconds between attempts to reopen a missing port: doubling from the first
+# to the last, with jitter. A hotplug event cuts the wait short.
+BACKOFF_MIN = 0.05
+BACKOFF_MAX = 5.0
+
+PACKETS = metrics.Counter("bring_serial_packets_total", "Packets received from the PCB", ["dtype"])
+
+# Label values built once, used per packet
+DTYPE_LABELS = tuple(f"{dtype:02X}" for dtype in range(256))
+
+
+class SerialReader:
+    """
+    Reads the serial port from the event loop. The port's fd is watched with
+    loop.add_reader; when it becomes readable everything the driver has
+    buffered is decoded at once and each packet is handed to
+    `on_packet(dtype, payload, read_at)`, read_at being the perf_counter
+    time the data was picked up.
+    """
+
+    def __init__(self, serial_bridge: SerialBridge, on_packet: Callable[[int, bytes, float], None]):
+        self.serial = serial_bridge
+        self.on_packet = on_packet
+        self._packet_counters: List[Optional[object]] = [None] * 256
+        self._lost: Optional[asyncio.Future] = None
+        self._wake = asyncio.Event()
+
+    def wake(self):
+        """The device may be back: retry now instead of at the end of the backoff."""
+        self._wake.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        # The port can also be dropped by a failed write on the writer thread,
+        # or opened by the voice assistant's connect()
+        self.serial.on_disconnect = lambda: loop.call_soon_threadsafe(self._set_lost)
+        self.serial.on_connect = lambda: loop.call_soon_threadsafe(self.wake)
+        delay = BACKOFF_MIN
+        while True:
+            if not self.serial.ser:
+                self._wake.clear()
+                # connect() globs and opens the device: keep it off the loop
+                await loop.run_in_executor(None, self.serial.connect)
+                if not self.serial.ser:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), delay / 2 + random.uniform(0, delay / 2))
+                    except asyncio.TimeoutError:
+                        pass
+                    delay = min(delay * 2, BACKOFF_MAX)
+                    continue
+            delay = BACKOFF_MIN
+
+            fd = self.serial.ser.fileno()
+            self._lost = loop.create_future()
+            loop.add_reader(fd, self._on_readable)
+            try:
+                await self._lost
+            finally:
+                loop.remove_reader(fd)
+
+    def _set_lost(self):
+        if self._lost is not None and not self._lost.done():
+            self._lost.set_result(None)
+
+    def _on_readable(self):
+        read_at = time.perf_counter()
+        for dtype, payload in self.serial.read_packets():
+            self._count(dtype)
+            self.on_packet(dtype, payload, read_at)
+        if not self.serial.ser:
+            self._set_lost()
+
+    def _count(self, dtype: int):
+        counter = self._packet_counters[dtype]
+        if counter is None:
+            counter = self._packet_counters[dtype] = PACKETS.labels(DTYPE_LABELS[dtype])
+        counter.inc()
@@ -0,0 +1,245 @@
+"""
+Raw UART capture and replay.
+
+A recording is a header (magic, format version, baud rate) followed by one
+record per chunk read from the port: microseconds since the previous chunk
+(u32), length (u16) and the bytes as they came off the wire. The replayer
+serves a recording, or synthetic traffic, on a pseudo-terminal so the bridge
+can run against it instead of the PCB:
+
+    python -m hardware_serial.recording record capture.bin [--seconds 60]
+    python -m hardware_serial.recording replay capture.bin [--speed 4] [--link /tmp/ttyACM-sim]
+    python -m hardware_serial.recording synth [--mix 11:100,12:20] [--speed 0]
+
+then start the bridge with SERIAL_PORT_GLOB=/tmp/ttyACM-sim.
+"""
+import argparse
+import heapq
+import os
+import struct
+import threading
+import time
+import tty
+import logging
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+log = logging.getLogger("serial")
+
+MAGIC = b"BRSL"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")  # magic, version, baud rate
+RECORD = struct.Struct("<IH")    # delta in microseconds, length
+MAX_DELTA_US = 2 ** 32 - 1
+MAX_CHUNK = 2 ** 16 - 1
+
+DEFAULT_MIX = "11:100,12:50,20:10"  # dtype (hex):packets per second
+
+
+class Recorder:
+    """Appends timestamped raw chunks to a recording; safe to call from the read path."""
+
+    def __init__(self, path: str, baudrate: int):
+        self._file: BinaryIO = open(path, "wb", buffering=64 * 1024)
+        self._file.write(HEADER.pack(MAGIC, VERSION, baudrate))
+        self._last: Optional[float] = None
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+    def write(self, data: bytes, at: Optional[float] = None):
+        at = time.monotonic() if at is None else at
+        with self._lock:
+            if self._file.closed:
+                return
+            delta = 0 if self._last is None else min(int((at - self._last) * 1e6), MAX_DELTA_US)
+            self._last = at
+            for offset in range(0, len(data), MAX_CHUNK):
+                chunk = data[offset:offset + MAX_CHUNK]
+                self._file.write(RECORD.pack(delta, len(chunk)))
+                self._file.write(chunk)
+                delta = 0
+            self.bytes += len(data)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_recording(path: str) -> Tuple[int, List[Tuple[float, bytes]]]:
+    """Returns (baud rate, [(seconds since the first chunk, bytes), ...])."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, baudrate = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} serial recording")
+    chunks = []
+    offset, t = HEADER.size, 0.0
+    while offset + RECORD.size <= len(data):
+        delta, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        t += delta / 1e6
+        chunks.append((t, data[offset:offset + length]))
+        offset += length
+    return baudrate, chunks
+
+
+def parse_mix(mix: str) -> Dict[int, float]:
+    """"11:100,12:20" -> {0x11: 100.0, 0x12: 20.0}"""
+    rates = {}
+    for item in mix.split(","):
+        dtype, rate = item.split(":")
+        rates[int(dtype, 16)] = float(rate)
+    return rates
+
+
+def synthetic_traffic(rates: Dict[int, float], payload_len: int = 8) -> Iterator[Tuple[float, bytes]]:
+    """
+    Endless packets, one per chunk, each dtype at its own rate. The payload
+    starts with a big-endian u32 sequence number (the packet's index in the
+    stream) so a receiver can match it to its send time; like the PCB, the
+    payload goes out reversed.
+    """
+    payload_len = max(4, payload_len)
+    padding = bytes(payload_len - 4)
+    schedule = [(0.0, dtype) for dtype in sorted(rates)]
+    heapq.heapify(schedule)
+    seq = 0
+    while schedule:
+        t, dtype = heapq.heappop(schedule)
+        payload = (seq & 0xFFFFFFFF).to_bytes(4, "big") + padding
+        yield t, bytes((dtype, payload_len + 2)) + payload[::-1]
+        seq += 1
+        heapq.heappush(schedule, (t + 1.0 / rates[dtype], dtype))
+
+
+class Replayer(threading.Thread):
+    """
+    Writes chunks to a pseudo-terminal as if the PCB were on the other end.
+    speed 1 keeps the recorded timing, N is N times faster and 0 writes as
+    fast as the reader drains the pty. `path` is the device to open (also
+    symlinked at `link`). With record_times, write_times[i] holds the
+    perf_counter time chunk i was written.
+    """
+
+    def __init__(self, chunks: Iterable[Tuple[float, bytes]], speed: float = 1.0,
+                 link: Optional[str] = None, record_times: bool = False):
+        super().__init__(daemon=True)
+        self.chunks = chunks
+        self.speed = speed
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.link = link
+        if link:
+            if os.path.islink(link):
+                os.unlink(link)
+            os.symlink(self.path, link)
+        self.write_times: Optional[List[float]] = [] if record_times else None
+        self.sent_bytes = 0
+        self.sent_chunks = 0
+        self.running = True
+
+    def run(self):
+        start = time.perf_counter()
+        for t, data in self.chunks:
+            if not self.running:
+                break
+            if self.speed > 0:
+                delay = start + t / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if self.write_times is not None:
+                # Before the write: the reader may see the data before os.write returns
+                self.write_times.append(time.perf_counter())
+            try:
+                os.write(self.master, data)
+            except OSError:
+                break
+            self.sent_bytes += len(data)
+            self.sent_chunks += 1
+        self.running = False
+
+    def stop(self):
+        self.running = False
+        if self.link and os.path.islink(self.link):
+            os.unlink(self.link)
+
+    def close(self):
+        self.stop()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def _record(args):
+    from hardware_serial.bridge import SerialBridge
+
+    # The bridge records to args.output instead of SERIAL_RECORD
+    bridge = SerialBridge(args.baudrate, record=args.output)
+    bridge.connect()
+    if not bridge.ser:
+        bridge.close()
+        raise SystemExit("No serial device to record from")
+    deadline = time.monotonic() + args.seconds if args.seconds else None
+    packets = 0
+    try:
+        while bridge.ser and (deadline is None or time.monotonic() < deadline):
+            packets += len(bridge.read_packets())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bridge.close()
+    print(f"{packets} packets, {bridge.recorder.bytes} bytes recorded to {args.output}")
+
+
+def _serve(args, chunks):
+    replayer = Replayer(chunks, args.speed, args.link)
+    print(f"Serving on {args.link or replayer.path} (Ctrl-C to stop)")
+    replayer.start()
+    try:
+        while replayer.is_alive():
+            replayer.join(1)
+    except KeyboardInterrupt:
+        pass
+    replayer.close()
+    print(f"{replayer.sent_chunks} chunks, {replayer.sent_bytes} bytes sent")
+
+
+def main():
+    from config import BAUDRATE
+
+    parser = argparse.ArgumentParser(description="Record or replay raw UART traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="capture the PCB's output")
+    record.add_argument("output")
+    record.add_argument("--seconds", type=float, default=0, help="0 records until Ctrl-C")
+    record.add_argument("--baudrate", type=int, default=BAUDRATE)
+    for name in ("replay", "synth"):
+        sub = commands.add_parser(name)
+        sub.add_argument("--speed", type=float, default=1.0, help="N times real time, 0 = as fast as possible")
+        sub.add_argument("--link", default="/tmp/ttyACM-sim", help="symlink to the pty")
+    commands.choices["replay"].add_argument("recording")
+    commands.choices["replay"].add_argument("--loop", action="store_true", help="start over at the end")
+    commands.choices["synth"].add_argument("--mix", default=DEFAULT_MIX, help="dtype:packets/s,...")
+    commands.choices["synth"].add_argument("--payload", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        _record(args)
+    elif args.command == "replay":
+        _, chunks = read_recording(args.recording)
+        duration = chunks[-1][0] if chunks else 0
+
+        def looped():
+            lap = 0
+            while True:
+                for t, data in chunks:
+                    yield lap * duration + t, data
+                if not args.loop or not chunks:
+                    return
+                lap += 1
+        _serve(args, looped())
+    else:
+        _serve(args, synthetic_traffic(parse_mix(args.mix), args.payload))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import heapq
+import itertools
+import threading
+import time
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from config import SERIAL_WRITE_QUEUE_BYTES
+from runtime import metrics
+
+log = logging.getLogger("serial")
+
+WRITE_QUEUE_DEPTH = metrics.Gauge("bring_serial_write_queue_depth", "Writes waiting for the UART", ["port"])
+WRITE_BYTES_PENDING = metrics.Gauge("bring_serial_write_bytes_pending", "Bytes waiting for the UART", ["port"])
+WRITES_DROPPED = metrics.Counter("bring_serial_writes_dropped_total",
+                                 "Writes dropped because the write queue was full")
+WRITES_COALESCED = metrics.Counter("bring_serial_writes_coalesced_total",
+                                   "RGB commands replaced by a newer one before being written")
+
+RGB_COMMAND = 0x0A
+
+# Lower value is written first
+PRIORITY_LED = 0
+PRIORITY_DEVICE = 1
+
+
+class SerialWriter(threading.Thread):
+    """
+    Single thread owning every write to the serial port.
+
+    Callers (the MQTT network thread, the voice assistant) only enqueue, so a
+    slow UART never blocks them and frames from different threads can't
+    interleave. RGB commands [0x0A, R, G, B] skip the queue: the most recent
+    one not yet written replaces any older one. Other writes are dropped once
+    more than `max_pending_bytes` are waiting. While paused (the port is gone)
+    writes keep queueing under the same limits and go out on resume().
+    """
+
+    def __init__(self, write: Callable[[bytes], None], port: str = "default",
+                 max_pending_bytes: int = SERIAL_WRITE_QUEUE_BYTES):
+        super().__init__(daemon=True)
+        self._write = write
+        self.max_pending_bytes = max_pending_bytes
+
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[int, int, bytes]] = []
+        self._seq = itertools.count()
+        self._rgb: Optional[bytes] = None
+        # monotonic time writing may (re)start at; None while paused
+        self._resume_at: Optional[float] = 0.0
+
+        # Backpressure metrics
+        self.bytes_pending = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.running = True
+        # One writer per board, each reporting under its port's name
+        WRITE_QUEUE_DEPTH.labels(port).set_function(lambda: self.depth)
+        WRITE_BYTES_PENDING.labels(port).set_function(lambda: self.bytes_pending)
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue) + (self._rgb is not None)
+
+    def submit(self, data: bytes, priority: int = PRIORITY_DEVICE) -> bool:
+        if not data:
+            return True
+        with self._cond:
+            if len(data) == 4 and data[0] == RGB_COMMAND:
+                if self._rgb is not None:
+                    self.bytes_pending -= len(self._rgb)
+                    self.coalesced += 1
+                    WRITES_COALESCED.inc()
+                self._rgb = data
+            elif self.bytes_pending + len(data) > self.max_pending_bytes:
+                self.dropped += 1
+                WRITES_DROPPED.inc()
+                if self.dropped % 100 == 1:
+                    log.warning("Serial write queue full (%d bytes), dropped %d writes so far",
+                                self.bytes_pending, self.dropped)
+                return False
+            else:
+                heapq.heappush(self._queue, (priority, next(self._seq), data))
+            self.bytes_pending += len(data)
+            self._cond.notify()
+        return True
+
+    def pause(self):
+        with self._cond:
+            self._resume_at = None
+
+    def resume(self, at: float = 0.0):
+        """Start writing again, not before monotonic time `at`."""
+        with self._cond:
+            self._resume_at = at
+            if self.depth:
+                log.info("Sending %d writes (%d bytes) held while the port was away",
+                         self.depth, self.bytes_pending)
+            self._cond.notify()
+
+    def _next(self) -> Optional[bytes]:
+        with self._cond:
+            while self.running:
+                if self._rgb is not None or self._queue:
+                    if self._resume_at is not None:
+                        delay = self._resume_at - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                        continue
+                self._cond.wait()
+            if self._rgb is not None:
+                data, self._rgb = self._rgb, None
+            elif self._queue:
+                data = heapq.heappop(self._queue)[2]
+            else:
+                return None
+            self.bytes_pending -= len(data)
+            return data
+
+    def run(self):
+        while self.running:
+            data = self._next()
+            if data is not None:
+                self._write(data)
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify()
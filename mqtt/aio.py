@@ -0,0 +1,127 @@
+import asyncio
+import socket
+import logging
+from typing import Optional
+
+import paho.mqtt.client as mqtt
+
+log = logging.getLogger("mqtt")
+
+MISC_INTERVAL = 1.0  # keepalive pings and retries, as paho's own loop does
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+CONNECT_TIMEOUT = 5.0  # seconds for the TCP connect, as paho's own default
+
+
+class AsyncioAdapter:
+    """
+    Drives a paho client from an asyncio loop instead of paho's network
+    thread: the socket is watched with add_reader/add_writer through paho's
+    socket callbacks, and a lost connection is re-established with backoff.
+    The client must then only be used from the loop's thread.
+
+    The TCP connection is opened by the loop (paho's reconnect() would block
+    in socket.create_connection for up to its timeout) and handed to paho.
+    The backoff only resets once the broker accepted the CONNECT: call
+    connected() from on_connect when rc is 0.
+    """
+
+    def __init__(self, client: mqtt.Client, loop: asyncio.AbstractEventLoop):
+        self.client = client
+        self.loop = loop
+        self.closed = loop.create_future()
+        self._misc: Optional[asyncio.Task] = None
+        self._attempt = 0
+        self._closing = False
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def connect(self, host: str, port: int, keepalive: int = 60):
+        self.host, self.port = host, port
+        self.client.connect_async(host, port, keepalive)
+        self._reconnect()
+
+    def connected(self):
+        self._attempt = 0
+
+    def _reconnect(self):
+        if not self._closing:
+            self.loop.create_task(self._open())
+
+    def _retry(self, reason):
+        delay = RECONNECT_DELAYS[min(self._attempt, len(RECONNECT_DELAYS) - 1)]
+        self._attempt += 1
+        log.error("MQTT connection failed: %s (retrying in %ds)", reason, delay)
+        self.loop.call_later(delay, self._reconnect)
+
+    async def _connect_socket(self) -> socket.socket:
+        error: Exception = OSError(f"no address for {self.host}")
+        for family, kind, proto, _, address in await self.loop.getaddrinfo(
+                self.host, self.port, type=socket.SOCK_STREAM):
+            sock = socket.socket(family, kind, proto)
+            sock.setblocking(False)
+            try:
+                await asyncio.wait_for(self.loop.sock_connect(sock, address), CONNECT_TIMEOUT)
+                return sock
+            except Exception as e:
+                sock.close()
+                error = e
+        raise error
+
+    async def _open(self):
+        try:
+            sock = await self._connect_socket()
+        except Exception as e:
+            self._retry(e)
+            return
+        if self._closing:
+            sock.close()
+            return
+        # reconnect() gets its socket from here; it then sends CONNECT as usual
+        self.client._create_socket_connection = lambda: sock
+        try:
+            self.client.reconnect()
+        except Exception as e:
+            sock.close()
+            self._retry(e)
+        finally:
+            del self.client._create_socket_connection
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+        if self._misc:
+            self._misc.cancel()
+            self._misc = None
+        if self._closing:
+            if not self.closed.done():
+                self.closed.set_result(None)
+        else:
+            # Also after a refused CONNACK: bad credentials back off like a dead broker
+            self._retry("connection closed")
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def _misc_loop(self):
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(MISC_INTERVAL)
+
+    async def close(self, timeout: float = 1.0):
+        """Send DISCONNECT and wait (briefly) for paho to close the socket."""
+        self._closing = True
+        if self._misc is None:
+            return
+        self.client.disconnect()
+        try:
+            await asyncio.wait_for(asyncio.shield(self.closed), timeout)
+        except asyncio.TimeoutError:
+            log.warning("MQTT disconnect timed out")
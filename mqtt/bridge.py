@@ -1,11 +1,51 @@
+import asyncio
+import time
 import logging
+from typing import Optional, Set, Tuple, Union
+
 import paho.mqtt.client as mqtt
-from config import MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD, MQTT_SUB_TOPIC
+from config import (
+    MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD, MQTT_SUB_TOPIC, MQTT_RAW_PREFIXES,
+    MQTT_SPOOL_DIR, MQTT_SPOOL_DRAIN_RATE, MQTT_SPOOL_INFLIGHT, MQTT_SPOOL_MAX_BYTES,
+    MQTT_SPOOL_SEGMENT_BYTES, MQTT_SPOOL_SYNC_INTERVAL,
+)
+from mqtt.aio import AsyncioAdapter
+from mqtt.spool import Spool
+from runtime import metrics
 
 log = logging.getLogger("mqtt")
 
+PUBLISHED = metrics.Counter("bring_mqtt_published_total", "Messages handed to the MQTT client")
+PUBLISH_ERRORS = metrics.Counter("bring_mqtt_publish_errors_total", "Messages the MQTT client rejected")
+PUBLISH_SECONDS = metrics.Histogram("bring_mqtt_publish_seconds", "Time spent in client.publish")
+RECEIVED = metrics.Counter("bring_mqtt_received_total", "Messages received on the subscribed topic")
+DISCONNECTS = metrics.Counter("bring_mqtt_disconnects_total", "Broker disconnections")
+CONNECTED = metrics.Gauge("bring_mqtt_connected", "1 while connected to the broker")
+
+SPOOL_TICK = 0.05  # seconds between drain rounds
+
+
+def is_raw_topic(topic: str) -> bool:
+    """Whether payloads on this (port-less) topic are raw bytes rather than hex strings."""
+    return topic.startswith(MQTT_RAW_PREFIXES)
+
+
+# device/write -> device/+/write: the same command for a single board
+_SUB_PREFIX, _, _SUB_LEAF = MQTT_SUB_TOPIC.rpartition("/")
+PORT_SUB_TOPIC = f"{_SUB_PREFIX}/+/{_SUB_LEAF}"
+
+
+def split_port(topic: str) -> Tuple[Optional[str], str]:
+    """"device/kitchen/write" -> ("kitchen", "device/write"); other topics have no port."""
+    if topic.startswith(_SUB_PREFIX + "/") and topic.endswith("/" + _SUB_LEAF):
+        port = topic[len(_SUB_PREFIX) + 1:-len(_SUB_LEAF) - 1]
+        if port and "/" not in port:
+            return port, MQTT_SUB_TOPIC
+    return None, topic
+
+
 class MQTTBridge:
-    def __init__(self, serial_bridge):
+    def __init__(self, serial_bridge, spool_dir: str = MQTT_SPOOL_DIR):
         self.serial = serial_bridge
         self.client = mqtt.Client()
 
@@ -13,43 +53,151 @@ class MQTTBridge:
         self.client.on_connect = self.on_connect
         self.client.on_disconnect = self.on_disconnect
         self.client.on_message = self.on_message
+        self.client.on_publish = self.on_publish
+        self.adapter: Optional[AsyncioAdapter] = None
+        self.connected = False
+        # Publishes made while disconnected go here instead of paho's unbounded queue
+        self.spool = Spool(spool_dir, MQTT_SPOOL_MAX_BYTES, MQTT_SPOOL_SEGMENT_BYTES) if spool_dir else None
+        self._spool_acked = asyncio.Event()
+        # Spooled messages awaiting their PUBACK; also their handles in the spool
+        self._spool_sent: Set[mqtt.MQTTMessageInfo] = set()
 
-    def connect(self):
-        try:
-            self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
-            self.client.loop_start()
-            log.info("Connecting to MQTT broker %s:%d", MQTT_BROKER, MQTT_PORT)
-        except Exception as e:
-            log.error("MQTT connection failed: %s", e)
+    def connect_asyncio(self, loop: asyncio.AbstractEventLoop, host: str = MQTT_BROKER,
+                        port: int = MQTT_PORT):
+        """Connect without paho's network thread; `loop` drives the socket."""
+        self.adapter = AsyncioAdapter(self.client, loop)
+        log.info("Connecting to MQTT broker %s:%d", host, port)
+        self.adapter.connect(host, port, 60)
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             log.info("MQTT connected")
-            client.subscribe(MQTT_SUB_TOPIC)
+            CONNECTED.set(1)
+            self.connected = True
+            if self.adapter:
+                self.adapter.connected()
+            client.subscribe([(MQTT_SUB_TOPIC, 0), (PORT_SUB_TOPIC, 0)])
         else:
             log.error("MQTT connect failed rc=%d", rc)
 
     def on_disconnect(self, client, userdata, rc):
         log.warning("MQTT disconnected rc=%d", rc)
+        DISCONNECTS.inc()
+        CONNECTED.set(0)
+        self.connected = False
 
     def on_message(self, client, userdata, msg):
+        RECEIVED.inc()
         try:
+            port, topic = split_port(msg.topic)
+            if is_raw_topic(topic):
+                self.serial.write(msg.payload, port=port)
+                return
             payload = msg.payload.decode()
             if len(payload) % 2 == 0:
-                self.serial.write_hex(payload)
+                self.serial.write_hex(payload, port=port)
         except Exception as e:
             log.error("MQTT message handling failed: %s", e)
 
-    def publish(self, topic: str, payload: str):
+    def on_publish(self, client, userdata, mid):
+        # Live QoS 0 publishes report their mid here too, and mids wrap at
+        # 65535, so this only wakes drain_spool to check its messages' state
+        if self._spool_sent:
+            self._spool_acked.set()
+
+    def _collect_acks(self):
+        """Pass the PUBACKs paho has recorded for spooled messages to the spool."""
+        for info in [info for info in self._spool_sent if info.is_published()]:
+            self._spool_sent.discard(info)
+            self.spool.acked(info)
+
+    def publish(self, topic: str, payload: Union[str, bytes]):
+        if self.spool and not self.connected:
+            self.spool.append(topic, payload)
+            return
+        start = time.perf_counter()
         try:
-            self.client.publish(topic, payload)
+            info = self.client.publish(topic, payload)
         except Exception as e:
             log.error("MQTT publishing handling failed: %s", e)
+            PUBLISH_ERRORS.inc()
+            return
+        PUBLISH_SECONDS.observe(time.perf_counter() - start)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            # Lost the connection before on_disconnect said so: paho drops QoS 0
+            PUBLISH_ERRORS.inc()
+            if self.spool:
+                self.spool.append(topic, payload)
+            return
+        PUBLISHED.inc()
 
-    def close(self):
-        try:
-            self.client.loop_stop()
-            self.client.disconnect()
-        except Exception:
-            pass
+    async def drain_spool(self, rate: float = MQTT_SPOOL_DRAIN_RATE, inflight: int = MQTT_SPOOL_INFLIGHT):
+        """
+        Resend what was spooled during an outage, with QoS 1, at most `rate`
+        messages a second (0: no limit) and `inflight` awaiting a PUBACK.
+        Live readings keep going out directly meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        budget, last = 0.0, loop.time()
+        synced = loop.time()
+        while True:
+            # paho marks a message published after on_publish returns, so acks are taken here
+            self._collect_acks()
+            if loop.time() - synced >= MQTT_SPOOL_SYNC_INTERVAL:
+                self.spool.sync()
+                synced = loop.time()
+            if not self.connected or not self.spool.pending:
+                await asyncio.sleep(SPOOL_TICK)
+                budget, last = 0.0, loop.time()
+                continue
+            if rate > 0:
+                now = loop.time()
+                budget = min(budget + (now - last) * rate, max(1.0, rate * SPOOL_TICK))
+                last = now
+            else:
+                budget = float("inf")
+            refused = False
+            while budget >= 1 and self.spool.inflight < inflight and self.connected:
+                message = self.spool.next()
+                if message is None:
+                    break
+                topic, payload, position = message
+                budget -= 1
+                try:
+                    info = self.client.publish(topic, payload, qos=1)
+                except ValueError as e:
+                    # paho will never take this one (bad topic, oversized); the
+                    # cursor passes it once a later message is acknowledged
+                    log.error("Dropping spooled message on %s: %s", topic, e)
+                    PUBLISH_ERRORS.inc()
+                    continue
+                except Exception as e:
+                    log.error("Resending spooled message failed: %s", e)
+                    info = None
+                # paho keeps (and resends after a reconnect) what it accepted;
+                # anything else is tried again next round
+                if info is None or info.rc not in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_NO_CONN):
+                    self.spool.unread()
+                    PUBLISH_ERRORS.inc()
+                    refused = True
+                    break
+                self._spool_sent.add(info)
+                self.spool.sent(info, position)
+                PUBLISHED.inc()
+            if refused:
+                await asyncio.sleep(SPOOL_TICK)
+            elif self.spool.inflight >= inflight:
+                # PUBACKs are handled on this loop too, so none can be missed here
+                self._spool_acked.clear()
+                try:
+                    await asyncio.wait_for(self._spool_acked.wait(), SPOOL_TICK)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(max(0.0, (1 - budget) / rate) if rate > 0 else 0)
 
+    async def close_async(self):
+        if self.adapter:
+            await self.adapter.close()
+        if self.spool:
+            self.spool.close()
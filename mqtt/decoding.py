@@ -0,0 +1,125 @@
+"""
+Typed decoding of PCB readings, declared per dtype in MQTT_DECODERS:
+
+    MQTT_DECODERS="11=<hH:temperature,humidity;12=<3h:x,y,z"
+
+Each struct format is compiled once; decoding a reading is a single unpack.
+Named fields come out as an object, unnamed ones as a list, encoded as
+compact JSON or CBOR.
+"""
+import json
+import math
+import struct
+import logging
+from typing import Dict, Optional, Tuple, Union
+
+from runtime import metrics
+
+log = logging.getLogger("mqtt")
+
+DECODE_ERRORS = metrics.Counter("bring_mqtt_decode_errors_total",
+                                "Readings whose length doesn't match their dtype's format", ["dtype"])
+
+Fields = Union[dict, list]
+
+
+class Decoder:
+    def __init__(self, dtype: int, spec: str):
+        fmt, _, names = spec.partition(":")
+        self.struct = struct.Struct(fmt.strip())
+        self.fields = tuple(name.strip() for name in names.split(",")) if names.strip() else None
+        count = len(self.struct.unpack(bytes(self.struct.size)))
+        if self.fields is not None and len(self.fields) != count:
+            raise ValueError(f"Decoder for {dtype:02X}: '{fmt}' has {count} values "
+                             f"but {len(self.fields)} names were given")
+        self._errors = DECODE_ERRORS.labels(f"{dtype:02X}")
+
+    def decode(self, payload: bytes) -> Optional[Fields]:
+        """None (and counted) if the payload isn't the format's size."""
+        if len(payload) != self.struct.size:
+            self._errors.inc()
+            return None
+        values = self.struct.unpack(payload)
+        return dict(zip(self.fields, values)) if self.fields else list(values)
+
+
+def load_decoders(specs: Dict[int, str]) -> Tuple[Optional[Decoder], ...]:
+    """Decoders indexed by dtype, None where there is none."""
+    decoders = [None] * 256
+    for dtype, spec in specs.items():
+        decoders[dtype] = Decoder(dtype, spec)
+    if specs:
+        log.info("Decoding dtypes %s", ", ".join(f"{dtype:02X}" for dtype in sorted(specs)))
+    return tuple(decoders)
+
+
+def _finite(value):
+    """`value` with NaN and infinities (which JSON can't carry) replaced by None."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_finite(item) for item in value]
+    return value
+
+
+def encode_json(value) -> str:
+    # Byte strings ("4s" fields) have no JSON type; send them as hex
+    try:
+        return json.dumps(value, separators=(",", ":"), default=bytes.hex, allow_nan=False)
+    except ValueError:
+        # A float field read NaN or inf (a sensor fault); those fields become null
+        return json.dumps(_finite(value), separators=(",", ":"), default=bytes.hex, allow_nan=False)
+
+
+def _cbor_head(major: int, n: int) -> bytes:
+    if n < 24:
+        return bytes((major << 5 | n,))
+    for info, size in ((24, 1), (25, 2), (26, 4), (27, 8)):
+        if n < 1 << 8 * size:
+            return bytes((major << 5 | info,)) + n.to_bytes(size, "big")
+    raise ValueError(f"{n} doesn't fit in CBOR")
+
+
+def _cbor(value, out: bytearray):
+    if value is None or value is True or value is False:
+        out.append({None: 0xF6, True: 0xF5, False: 0xF4}[value])
+    elif isinstance(value, int):
+        out += _cbor_head(0, value) if value >= 0 else _cbor_head(1, -1 - value)
+    elif isinstance(value, float):
+        # Single precision when that loses nothing (always true for "f" fields)
+        try:
+            single = struct.pack(">f", value)
+        except OverflowError:
+            single = None
+        if single is not None and (math.isnan(value) or struct.unpack(">f", single)[0] == value):
+            out += b"\xfa" + single
+        else:
+            out += b"\xfb" + struct.pack(">d", value)
+    elif isinstance(value, bytes):
+        out += _cbor_head(2, len(value)) + value
+    elif isinstance(value, str):
+        data = value.encode()
+        out += _cbor_head(3, len(data)) + data
+    elif isinstance(value, (list, tuple)):
+        out += _cbor_head(4, len(value))
+        for item in value:
+            _cbor(item, out)
+    elif isinstance(value, dict):
+        out += _cbor_head(5, len(value))
+        for key, item in value.items():
+            _cbor(key, out)
+            _cbor(item, out)
+    else:
+        raise TypeError(f"Can't encode {type(value).__name__} as CBOR")
+
+
+def encode_cbor(value) -> bytes:
+    """The subset of CBOR (RFC 8949) struct values need: ints, floats, bools, bytes, text, arrays, maps."""
+    out = bytearray()
+    _cbor(value, out)
+    return bytes(out)
+
+
+ENCODINGS = {"json": encode_json, "cbor": encode_cbor}
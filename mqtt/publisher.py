@@ -0,0 +1,142 @@
+import logging
+from typing import Dict, List, Optional, Tuple, Union
+
+from config import (
+    MQTT_BATCH_SIZE, MQTT_DECODED, MQTT_DECODED_FORMAT, MQTT_DECODERS, MQTT_PORT_TOPICS,
+    MQTT_PUBLISH_MODE, MQTT_PUBLISH_WINDOW,
+)
+from mqtt.bridge import MQTTBridge, is_raw_topic
+from mqtt.decoding import ENCODINGS, load_decoders
+
+log = logging.getLogger("mqtt")
+
+PUBLISH_MODES = ("direct", "latest", "batch")
+DECODED_MODES = ("off", "alongside", "instead")
+
+# (topics, batch topics, decoded topics, decoded batch topics), each indexed by dtype
+Topics = Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]
+
+# Topic strings are built once (per port) instead of per packet
+TOPICS = tuple(f"device/{dtype:02X}" for dtype in range(256))
+RAW_TOPICS = tuple(is_raw_topic(topic) for topic in TOPICS)
+
+
+def port_topics(port: Optional[str]) -> Topics:
+    """Topics for readings from `port`."""
+    if port is None or not MQTT_PORT_TOPICS:
+        topics = TOPICS
+    else:
+        topics = tuple(f"device/{port}/{dtype:02X}" for dtype in range(256))
+    batch_topics = tuple(f"{topic}/batch" for topic in topics)
+    return (topics, batch_topics, tuple(f"{topic}/decoded" for topic in topics),
+            tuple(f"{topic}/decoded" for topic in batch_topics))
+
+
+def _encode(dtype: int, payload: bytes) -> Union[str, bytes]:
+    return payload if RAW_TOPICS[dtype] else payload.hex()
+
+
+def _encode_batch(dtype: int, batch: List[bytes]) -> Union[str, bytes]:
+    if RAW_TOPICS[dtype]:
+        return b"".join(bytes((len(payload),)) + payload for payload in batch)
+    return ",".join(payload.hex() for payload in batch)
+
+
+class Publisher:
+    """
+    Forwards device readings to MQTT.
+
+    direct: one message per reading.
+    latest: only the last reading per topic is sent every `window` seconds.
+    batch:  readings are packed `batch_size` at a time into one message on
+            device/{dtype}/batch; partial batches go out every `window`.
+
+    Readings tagged with a port go to device/{port}/{dtype} (unless
+    MQTT_PORT_TOPICS is off). Topics matching MQTT_RAW_PREFIXES carry the
+    payload bytes as-is (batches as [length, bytes...] records); all others
+    carry hex strings (batches comma-separated).
+
+    dtypes with a decoder also get their fields as JSON or CBOR (batches as
+    an array): on .../decoded alongside the hex, or instead of it. A reading
+    of the wrong size is sent as hex, or as null within a batch.
+
+    Not thread-safe: submit() and flush() are called from the event loop,
+    which also calls flush() every `window` in latest and batch mode.
+    """
+
+    def __init__(
+        self,
+        mqtt_bridge: MQTTBridge,
+        mode: str = MQTT_PUBLISH_MODE,
+        window: float = MQTT_PUBLISH_WINDOW,
+        batch_size: int = MQTT_BATCH_SIZE,
+        decoders: Dict[int, str] = MQTT_DECODERS,
+        decoded: str = MQTT_DECODED,
+        decoded_format: str = MQTT_DECODED_FORMAT,
+    ):
+        if mode not in PUBLISH_MODES:
+            raise ValueError(f"Unknown MQTT publish mode '{mode}', expected one of {PUBLISH_MODES}")
+        if decoded not in DECODED_MODES:
+            raise ValueError(f"Unknown decoded mode '{decoded}', expected one of {DECODED_MODES}")
+        if decoded_format not in ENCODINGS:
+            raise ValueError(f"Unknown decoded format '{decoded_format}', expected one of {tuple(ENCODINGS)}")
+        self.mqtt = mqtt_bridge
+        self.mode = mode
+        self.window = window
+        self.batch_size = max(1, batch_size)
+        self.decoders = load_decoders(decoders if decoded != "off" else {})
+        self.replace_hex = decoded == "instead"
+        self._encode_fields = ENCODINGS[decoded_format]
+
+        self._topics: Dict[Optional[str], Topics] = {}
+        self._latest: Dict[Tuple[Optional[str], int], bytes] = {}
+        self._batches: Dict[Tuple[Optional[str], int], List[bytes]] = {}
+
+    def _topics_for(self, port: Optional[str]) -> Topics:
+        topics = self._topics.get(port)
+        if topics is None:
+            topics = self._topics[port] = port_topics(port)
+        return topics
+
+    def submit(self, dtype: int, payload: bytes, port: Optional[str] = None):
+        if self.mode == "direct":
+            self._publish(self._topics_for(port), dtype, payload)
+        elif self.mode == "latest":
+            self._latest[port, dtype] = payload
+        else:
+            key = (port, dtype)
+            batch = self._batches.setdefault(key, [])
+            batch.append(payload)
+            if len(batch) < self.batch_size:
+                return
+            del self._batches[key]
+            self._publish_batch(self._topics_for(port), dtype, batch)
+
+    def _publish(self, topics: Topics, dtype: int, payload: bytes):
+        decoder = self.decoders[dtype]
+        if decoder is not None:
+            fields = decoder.decode(payload)
+            if fields is not None:
+                if self.replace_hex:
+                    self.mqtt.publish(topics[0][dtype], self._encode_fields(fields))
+                    return
+                self.mqtt.publish(topics[2][dtype], self._encode_fields(fields))
+        self.mqtt.publish(topics[0][dtype], _encode(dtype, payload))
+
+    def _publish_batch(self, topics: Topics, dtype: int, batch: List[bytes]):
+        decoder = self.decoders[dtype]
+        if decoder is not None:
+            fields = self._encode_fields([decoder.decode(payload) for payload in batch])
+            if self.replace_hex:
+                self.mqtt.publish(topics[1][dtype], fields)
+                return
+            self.mqtt.publish(topics[3][dtype], fields)
+        self.mqtt.publish(topics[1][dtype], _encode_batch(dtype, batch))
+
+    def flush(self):
+        latest, self._latest = self._latest, {}
+        batches, self._batches = self._batches, {}
+        for (port, dtype), payload in latest.items():
+            self._publish(self._topics_for(port), dtype, payload)
+        for (port, dtype), batch in batches.items():
+            self._publish_batch(self._topics_for(port), dtype, batch)
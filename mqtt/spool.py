@@ -0,0 +1,287 @@
+"""
+Disk-backed store-and-forward queue for MQTT outages.
+
+Messages published while the broker is unreachable are appended to
+fixed-size, memory-mapped segment files. Once reconnected they are sent
+again (see MQTTBridge.drain_spool) with QoS 1; the broker's PUBACKs move a
+cursor that lives in its own memory-mapped file, so after a restart sending
+resumes at the first unacknowledged message. Delivery is at-least-once:
+messages sent but not yet acknowledged when the process died are sent twice.
+New records and the cursor are msync'd every MQTT_SPOOL_SYNC_INTERVAL, which
+bounds what a power cut can lose or resend.
+When the spool would grow past `max_bytes` the oldest segment is dropped,
+read or not.
+
+A record is [payload length u32, topic length u16, crc32 u32, topic, payload];
+a zero topic length marks the end of a segment's data. Records whose crc
+doesn't match (a write torn by a power cut) end the segment too.
+"""
+import collections
+import mmap
+import os
+import struct
+import threading
+import zlib
+import logging
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+from runtime import metrics
+
+log = logging.getLogger("mqtt")
+
+SPOOLED = metrics.Counter("bring_mqtt_spooled_total", "Messages written to the outage spool")
+SPOOL_SENT = metrics.Counter("bring_mqtt_spool_acked_total", "Spooled messages acknowledged by the broker")
+SPOOL_DROPPED = metrics.Counter("bring_mqtt_spool_dropped_total",
+                                "Spooled messages lost to the size cap, or too large to spool")
+SPOOL_SEGMENTS = metrics.Gauge("bring_mqtt_spool_segments", "Segment files in the outage spool")
+
+RECORD = struct.Struct("<IHI")
+CURSOR = struct.Struct("<QI")  # segment number, offset
+
+# (segment number, offset) of a record; tuples compare in spool order
+Position = Tuple[int, int]
+
+
+def _record_crc(topic: bytes, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(topic))
+
+
+class Segment:
+    """One memory-mapped spool file, appended to until full."""
+
+    def __init__(self, path: str, number: int, size: int):
+        self.path = path
+        self.number = number
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size == 0:
+                # Sparse: blocks are only allocated as records are written
+                os.ftruncate(fd, size)
+            self.size = os.fstat(fd).st_size
+            self.map = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        self.end = 0
+        while True:
+            record = self.read(self.end)
+            if record is None:
+                break
+            self.end = record[2]
+        # Written to storage up to here
+        self.synced = self.end
+
+    def append(self, topic: bytes, payload: bytes) -> bool:
+        end = self.end + RECORD.size + len(topic) + len(payload)
+        if end + RECORD.size > self.size:
+            # Room must stay for the end marker
+            return False
+        RECORD.pack_into(self.map, self.end, len(payload), len(topic), _record_crc(topic, payload))
+        start = self.end + RECORD.size
+        self.map[start:start + len(topic)] = topic
+        self.map[start + len(topic):end] = payload
+        self.end = end
+        return True
+
+    def read(self, offset: int) -> Optional[Tuple[bytes, bytes, int]]:
+        """(topic, payload, offset of the next record), or None at the end."""
+        if offset + RECORD.size > self.size:
+            return None
+        payload_len, topic_len, crc = RECORD.unpack_from(self.map, offset)
+        start = offset + RECORD.size
+        end = start + topic_len + payload_len
+        if topic_len == 0 or end + RECORD.size > self.size:
+            return None
+        topic = self.map[start:start + topic_len]
+        payload = self.map[start + topic_len:end]
+        if _record_crc(topic, payload) != crc:
+            return None
+        return topic, payload, end
+
+    def count(self, offset: int = 0) -> int:
+        records = 0
+        while offset < self.end:
+            offset = self.read(offset)[2]
+            records += 1
+        return records
+
+    def sync(self):
+        if self.end > self.synced:
+            start = self.synced - self.synced % mmap.PAGESIZE
+            self.map.flush(start, self.end - start)
+            self.synced = self.end
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+
+
+class Spool:
+    """
+    Append with append() while disconnected; once connected, take messages
+    with next(), report each one sent with sent() (along with a handle unique
+    to that send, such as paho's MQTTMessageInfo: message ids wrap), and its
+    PUBACK with acked(). A message that couldn't be sent is given back with
+    unread(). Appends and acks only reach the page cache; sync() writes them
+    to storage.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, segment_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(2, max_bytes // segment_bytes)
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.segments: Dict[int, Segment] = collections.OrderedDict()
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".seg"):
+                number = int(name[:-4])
+                self.segments[number] = Segment(self._path(number), number, segment_bytes)
+        if not self.segments:
+            self._new_segment(0)
+        SPOOL_SEGMENTS.set_function(lambda: len(self.segments))
+
+        fd = os.open(os.path.join(directory, "cursor"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < CURSOR.size:
+                os.ftruncate(fd, CURSOR.size)
+            self._cursor_map = mmap.mmap(fd, CURSOR.size)
+        finally:
+            os.close(fd)
+        # Acknowledged up to here (persisted); sent up to _next
+        self.cursor: Position = max(CURSOR.unpack_from(self._cursor_map), (self._first.number, 0))
+        self._cursor_dirty = False
+        self._next = self.cursor
+        # Where the message last returned by next() starts
+        self._read: Position = self._next
+        # send handle -> [position after it, acknowledged], in the order sent
+        self._inflight: "collections.OrderedDict[Hashable, List]" = collections.OrderedDict()
+        if self.pending:
+            log.info("MQTT spool in %s has %d messages to send", directory, self.backlog())
+
+    def _path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{number:012d}.seg")
+
+    @property
+    def _first(self) -> Segment:
+        return next(iter(self.segments.values()))
+
+    @property
+    def _head(self) -> Segment:
+        return next(reversed(self.segments.values()))
+
+    def _new_segment(self, number: int):
+        while len(self.segments) >= self.max_segments:
+            self._evict()
+        self.segments[number] = Segment(self._path(number), number, self.segment_bytes)
+
+    def _evict(self):
+        oldest = self.segments.pop(self._first.number)
+        if self.cursor[0] <= oldest.number:
+            dropped = oldest.count(self.cursor[1] if self.cursor[0] == oldest.number else 0)
+            SPOOL_DROPPED.inc(dropped)
+            log.warning("MQTT spool full, dropped %d unacknowledged messages", dropped)
+            self.cursor = (oldest.number + 1, 0)
+            self._next = max(self._next, self.cursor)
+            self._save_cursor()
+        oldest.close()
+        os.unlink(oldest.path)
+
+    def append(self, topic: str, payload: Union[str, bytes]) -> bool:
+        topic_bytes = topic.encode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with self._lock:
+            if not self._head.append(topic_bytes, payload):
+                if RECORD.size * 2 + len(topic_bytes) + len(payload) > self.segment_bytes:
+                    SPOOL_DROPPED.inc()
+                    return False
+                self._new_segment(self._head.number + 1)
+                self._head.append(topic_bytes, payload)
+        SPOOLED.inc()
+        return True
+
+    @property
+    def pending(self) -> bool:
+        """Messages not sent yet."""
+        return self._next < (self._head.number, self._head.end)
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def backlog(self) -> int:
+        """Messages not acknowledged yet; walks the spool."""
+        with self._lock:
+            return sum(
+                segment.count(self.cursor[1] if segment.number == self.cursor[0] else 0)
+                for segment in self.segments.values() if segment.number >= self.cursor[0]
+            )
+
+    def next(self) -> Optional[Tuple[str, bytes, Position]]:
+        """The next message to send and the position after it, or None."""
+        with self._lock:
+            while self.pending:
+                number, offset = self._next
+                segment = self.segments.get(number)
+                record = segment.read(offset) if segment else None
+                if record is None:
+                    # Past this segment's last record: on to the next one
+                    self._next = (number + 1, 0)
+                    continue
+                topic, payload, end = record
+                self._read = self._next
+                self._next = (number, end)
+                return topic.decode(), payload, self._next
+            return None
+
+    def unread(self):
+        """Undo the last next(): that message is returned again."""
+        with self._lock:
+            self._next = max(self._read, self.cursor)
+
+    def sent(self, handle: Hashable, position: Position):
+        with self._lock:
+            self._inflight[handle] = [position, False]
+
+    def acked(self, handle: Hashable):
+        """
+        The message sent as `handle` was acknowledged; the cursor moves past
+        every message acknowledged so far without a gap.
+        """
+        with self._lock:
+            entry = self._inflight.get(handle)
+            if entry is None:
+                return
+            entry[1] = True
+            position = None
+            while self._inflight and next(iter(self._inflight.values()))[1]:
+                position = self._inflight.popitem(last=False)[1][0]
+                SPOOL_SENT.inc()
+            if position is not None and position > self.cursor:
+                self.cursor = position
+                self._save_cursor()
+                # Segments wholly acknowledged are done with (the head is kept to append to)
+                while self._first.number < self.cursor[0] and len(self.segments) > 1:
+                    segment = self.segments.pop(self._first.number)
+                    segment.close()
+                    os.unlink(segment.path)
+
+    def _save_cursor(self):
+        CURSOR.pack_into(self._cursor_map, 0, *self.cursor)
+        self._cursor_dirty = True
+
+    def sync(self):
+        """msync records appended and the cursor moved since the last sync."""
+        with self._lock:
+            for segment in self.segments.values():
+                segment.sync()
+            if self._cursor_dirty:
+                self._cursor_map.flush()
+                self._cursor_dirty = False
+
+    def close(self):
+        with self._lock:
+            for segment in self.segments.values():
+                segment.close()
+            self._cursor_map.flush()
+            self._cursor_map.close()
@@ -0,0 +1,145 @@
+import asyncio
+import signal
+import threading
+import time
+import logging
+from typing import Callable, List, Set
+
+from config import BAUDRATE, MQTT_PUBLISH_MODE, WAKE_WORD_MODELS, WAKE_WORD_THRESHOLD, WAKE_WORD_THRESHOLDS
+from audio.voice_assistant import VoiceAssistant
+from camera.streamer import CameraStreamer
+from hardware_serial.ports import PortManager
+from mqtt.bridge import MQTTBridge
+from mqtt.publisher import Publisher
+from runtime import metrics, startup
+from runtime.logger import RuntimeLogger
+
+log = logging.getLogger("main")
+
+SHUTDOWN_TIMEOUT = 5.0  # seconds to wait for the camera and voice threads
+
+STAGE_SECONDS = metrics.Histogram(
+    "bring_stage_seconds", "Per-packet time spent in each forwarding stage", labelnames=("stage",),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1),
+)
+SERIAL_STAGE = STAGE_SECONDS.labels("serial")    # port readable -> packet decoded
+PUBLISH_STAGE = STAGE_SECONDS.labels("publish")  # handed to the publisher -> queued in paho
+
+
+def run_in_thread(fn: Callable[[], None], name: str) -> asyncio.Future:
+    """
+    Run a blocking loop on its own daemon thread; the returned future resolves
+    when it returns. Unlike an executor, a thread stuck in a driver call can't
+    hold up interpreter exit.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def target():
+        try:
+            fn()
+        except BaseException as e:
+            loop.call_soon_threadsafe(lambda e=e: future.done() or future.set_exception(e))
+        else:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+    threading.Thread(target=target, name=name, daemon=True).start()
+    return future
+
+
+class Runtime:
+    """
+    Everything on one asyncio event loop. Serial data is read when a board's
+    port becomes readable and forwarded to MQTT in the same callback; paho's
+    socket is driven by the loop; stdin commands are read the same way. The
+    camera and voice assistant are blocking device loops (V4L2, PortAudio),
+    so they keep their own threads, supervised as futures. SIGINT/SIGTERM
+    shut everything down in order.
+    """
+
+    def __init__(self):
+        self.verbose_devices: Set[int] = set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stop.set)
+
+        self.serial = PortManager(BAUDRATE, self._forward)
+        self.mqtt = MQTTBridge(self.serial)
+        self.mqtt.connect_asyncio(loop)
+        self.publisher = Publisher(self.mqtt)
+        self.serial.start()
+        self.commands = RuntimeLogger(self.verbose_devices)
+        self.commands.start(loop)
+
+        self.camera = CameraStreamer()
+        self.voice = VoiceAssistant(
+            self.serial,
+            wake_word_models=WAKE_WORD_MODELS,
+            wake_word_threshold=WAKE_WORD_THRESHOLD,
+            wake_word_thresholds=WAKE_WORD_THRESHOLDS,
+        )
+
+        # Losing one of these stops the bridge; camera and voice may end on their own
+        core = [loop.create_task(self.serial.run(), name="serial")]
+        if MQTT_PUBLISH_MODE != "direct":
+            core.append(loop.create_task(self._flush_loop(), name="publisher"))
+        if self.mqtt.spool:
+            core.append(loop.create_task(self.mqtt.drain_spool(), name="spool"))
+        workers = [run_in_thread(self.camera.run, "camera"), run_in_thread(self.voice.run, "voice")]
+        for future, name in zip(workers, ("camera", "voice")):
+            future.add_done_callback(lambda f, name=name: self._ended(name, f))
+        log.info("Main loop started")
+
+        stopped = loop.create_task(self._stop.wait())
+        done, _ = await asyncio.wait(core + [stopped], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task is not stopped:
+                self._ended(task.get_name(), task)
+        await self._shutdown(core, workers)
+
+    def _forward(self, port: str, dtype: int, payload: bytes, read_at: float):
+        start = time.perf_counter()
+        self.publisher.submit(dtype, payload, port)
+        SERIAL_STAGE.observe(start - read_at)
+        PUBLISH_STAGE.observe(time.perf_counter() - start)
+        startup.mark("first_packet")
+
+        if dtype in self.verbose_devices:
+            log.info("Device %s/%02X payload=%s", port, dtype, payload.hex())
+
+    async def _flush_loop(self):
+        log.info("Publishing in %s mode every %.3fs", self.publisher.mode, self.publisher.window)
+        while True:
+            await asyncio.sleep(self.publisher.window)
+            self.publisher.flush()
+
+    def _ended(self, name: str, future: asyncio.Future):
+        if future.cancelled():
+            return
+        if future.exception():
+            log.error("%s failed: %r", name, future.exception())
+        elif not self._stop.is_set():
+            log.warning("%s stopped", name)
+
+    async def _shutdown(self, core: List[asyncio.Task], workers: List[asyncio.Future]):
+        log.info("Shutting down...")
+        self._stop.set()
+        self.commands.stop()
+        # Blocking loops are asked to stop first; they may take a moment
+        self.camera.stop()
+        self.voice.stop()
+        for task in core:
+            task.cancel()
+        await asyncio.gather(*core, return_exceptions=True)
+
+        self.publisher.flush()
+        await self.mqtt.close_async()
+        self.serial.close()
+
+        _, pending = await asyncio.wait(workers, timeout=SHUTDOWN_TIMEOUT)
+        if pending:
+            log.warning("%d worker thread(s) did not stop in %.0fs", len(pending), SHUTDOWN_TIMEOUT)
+        log.info("Shutdown complete")
@@ -1,32 +1,60 @@
-import threading
+import os
 import sys
+import asyncio
 import logging
 from typing import Set
 
 log = logging.getLogger("runtime")
 
-class RuntimeLogger(threading.Thread):
-    def __init__(self, enabled_devices: Set[int]):
-        super().__init__(daemon=True)
-        self.enabled_devices = enabled_devices
 
-    def run(self):
-        while True:
-            line = sys.stdin.readline().strip()
-            if not line:
-                continue
+def handle_command(line: str, enabled_devices: Set[int]):
+    """`log add|remove <hex ids...>` toggles payload logging per device type."""
+    parts = line.split()
+    if not parts or parts[0] != "log":
+        return
+    cmd = parts[1] if len(parts) > 1 else None
+    ids = [int(x, 16) for x in parts[2:]]
+
+    if cmd == "add":
+        enabled_devices.update(ids)
+    elif cmd == "remove":
+        enabled_devices.difference_update(ids)
+
+    log.info("Logging devices: %s",
+             [f"{x:02X}" for x in enabled_devices])
 
-            parts = line.split()
-            cmd = parts[1] if len(parts) > 1 else None
-            ids = [int(x, 16) for x in parts[2:]]
 
-            if parts[0] != "log":
-                continue
+class RuntimeLogger:
+    """Reads commands from stdin on the event loop; stops watching at EOF."""
+
+    def __init__(self, enabled_devices: Set[int]):
+        self.enabled_devices = enabled_devices
+        self._fd = None
+        self._pending = b""
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        try:
+            fd = sys.stdin.fileno()
+            loop.add_reader(fd, self._on_readable)
+        except (AttributeError, ValueError, OSError) as e:
+            # No stdin, or a regular file epoll can't watch (e.g. `< /dev/null` under a service manager)
+            log.info("stdin commands unavailable: %s", e)
+            return
+        self.loop, self._fd = loop, fd
 
-            if cmd == "add":
-                self.enabled_devices.update(ids)
-            elif cmd == "remove":
-                self.enabled_devices.difference_update(ids)
+    def _on_readable(self):
+        data = os.read(self._fd, 4096)
+        if not data:
+            self.stop()
+            return
+        *lines, self._pending = (self._pending + data).split(b"\n")
+        for line in lines:
+            try:
+                handle_command(line.decode(errors="replace"), self.enabled_devices)
+            except ValueError as e:
+                log.warning("Bad command %r: %s", line, e)
 
-            log.info("Logging devices: %s",
-                     [f"{x:02X}" for x in self.enabled_devices])
+    def stop(self):
+        if self._fd is not None:
+            self.loop.remove_reader(self._fd)
+            self._fd = None
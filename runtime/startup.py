@@ -0,0 +1,43 @@
+import logging
+import os
+import time
+
+from runtime import metrics
+
+log = logging.getLogger("startup")
+
+MILESTONES = metrics.Gauge("bring_startup_seconds", "Seconds from process start to each startup milestone",
+                           labelnames=("milestone",))
+
+
+
+def _process_start() -> float:
+    """
+    time.monotonic() at which this process started, from /proc/self/stat;
+    imports (cv2, onnxruntime) take most of a cold boot and must count.
+    Falls back to now where there is no /proc.
+    """
+    now = time.monotonic()
+    try:
+        with open("/proc/self/stat") as f:
+            # starttime (field 22) in clock ticks since boot; comm may hold spaces
+            ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return now
+    return now - max(0.0, uptime - ticks / os.sysconf("SC_CLK_TCK"))
+
+
+_started = _process_start()
+_reached = set()
+
+
+def mark(milestone: str):
+    """Record the first time a milestone is reached; later calls are no-ops."""
+    if milestone in _reached:
+        return
+    _reached.add(milestone)
+    elapsed = time.monotonic() - _started
+    MILESTONES.labels(milestone).set(elapsed)
+    log.info("Startup: %s after %.0f ms", milestone, 1000 * elapsed)